@@ -8,10 +8,32 @@ Syncs orders from Shopify API to local PostgreSQL database.
 """
 
 import os
+import io
+import csv
 import json
+import hashlib
 import time
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict, Any, List, Tuple
+from typing import Optional, Dict, Any, Iterable, Iterator, List, Tuple
+
+import psycopg2.extensions
+from psycopg2.extras import execute_values
+
+from shopify_api import prefetch
+
+# orjson is a much faster encoder for the shipping_address payloads;
+# fall back to the stdlib when it isn't installed
+try:
+    import orjson
+
+    def json_dumps(value, sort_keys: bool = False) -> str:
+        """Serialize a value to a JSON string."""
+        return orjson.dumps(value, option=orjson.OPT_SORT_KEYS if sort_keys else None).decode()
+except ImportError:
+    def json_dumps(value, sort_keys: bool = False) -> str:
+        """Serialize a value to a JSON string."""
+        return json.dumps(value, sort_keys=sort_keys)
 
 # Timezone support for Vancouver/PST
 try:
@@ -26,10 +48,190 @@ def now_pst():
     return datetime.now(PST)
 
 
+_log_timestamp = (0, '')  # (epoch second, formatted HH:MM:SS)
+
+
 def sync_log(message: str):
-    """Log a sync message with timestamp."""
-    timestamp = datetime.now().strftime('%H:%M:%S')
-    print(f"[orders_sync {timestamp}] {message}")
+    """Log a sync message with timestamp (formatted at most once per second)."""
+    global _log_timestamp
+    second = int(time.time())
+    if second != _log_timestamp[0]:
+        _log_timestamp = (second, time.strftime('%H:%M:%S', time.localtime(second)))
+    print(f"[orders_sync {_log_timestamp[1]}] {message}")
+
+
+# ciso8601 parses ISO 8601 in C; fall back to datetime.fromisoformat without it
+try:
+    from ciso8601 import parse_datetime as _parse_iso8601
+except ImportError:
+    _parse_iso8601 = datetime.fromisoformat
+
+
+def parse_shopify_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """
+    Parse a Shopify ISO 8601 timestamp the way a TIMESTAMP column stores it:
+    wall-clock time with the UTC offset discarded.
+    """
+    if not value:
+        return None
+    try:
+        return _parse_iso8601(value).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def order_content_hash(order_fields: Tuple, line_items: List) -> str:
+    """
+    Hex digest of the values the sync writes for an order (its row without
+    timestamps, plus its line item rows and options), used to tell whether
+    anything stored has actually changed. The raw payload can't be used:
+    nested objects like customer and fulfillments carry their own updated_at.
+    """
+    return hashlib.blake2b(json_dumps([order_fields, line_items]).encode(), digest_size=16).hexdigest()
+
+
+# Top-level order fields requested from Shopify. The REST `fields` filter only
+# applies to top-level keys, and must be repeated on page_info requests or later
+# pages come back with the full order payload. billing_address isn't stored,
+# but _get_customer_name falls back to it when the shipping address has no name.
+ORDER_FIELDS = (
+    "id,name,email,phone,total_price,subtotal_price,total_tax,"
+    "shipping_lines,financial_status,fulfillment_status,fulfillments,"
+    "line_items,shipping_address,billing_address,note,"
+    "created_at,updated_at,cancelled_at,cancel_reason,customer"
+)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# Bulk Upsert SQL
+# ══════════════════════════════════════════════════════════════════════════════
+
+# Column order of the tuples built by OrdersSync._build_order_row
+ORDER_COLUMNS = (
+    'shopify_order_id', 'order_number', 'customer_name', 'customer_email',
+    'customer_phone', 'shipping_address', 'note',
+    'total_price', 'subtotal_price', 'total_tax',
+    'total_shipping', 'total_weight_grams', 'currency', 'financial_status', 'fulfillment_status',
+    'tracking_number', 'shopify_created_at', 'shopify_updated_at',
+    'cancelled_at', 'cancel_reason', 'content_hash', 'synced_at', 'created_at',
+    'updated_at',
+)
+_CONTENT_HASH_INDEX = ORDER_COLUMNS.index('content_hash')
+
+# created_at keeps its original value on conflict; everything else follows Shopify
+_ORDER_UPDATE_SET = ",\n        ".join(
+    f"{col} = EXCLUDED.{col}"
+    for col in ORDER_COLUMNS
+    if col not in ('shopify_order_id', 'created_at')
+)
+
+# One statement per page of orders (psycopg2 execute_values fills in VALUES %s)
+UPSERT_ORDERS_SQL = f"""
+    INSERT INTO orders ({', '.join(ORDER_COLUMNS)})
+    VALUES %s
+    ON CONFLICT (shopify_order_id) DO UPDATE SET
+        {_ORDER_UPDATE_SET}
+    RETURNING id, shopify_order_id
+"""
+
+# Incremental syncs leave rows alone when Shopify's updated_at hasn't moved.
+# Skipped rows are not RETURNed, so their line items are left alone as well.
+UPSERT_CHANGED_ORDERS_SQL = UPSERT_ORDERS_SQL.replace(
+    "    RETURNING id, shopify_order_id",
+    "    WHERE orders.shopify_updated_at IS DISTINCT FROM EXCLUDED.shopify_updated_at\n"
+    "    RETURNING id, shopify_order_id"
+)
+
+# Server-side prepared version of the upsert for the order-by-order fallback,
+# which otherwise re-sends and re-plans the full statement for every order.
+# Parameter types are inferred from the target columns.
+PREPARE_UPSERT_ORDER_SQL = f"""
+    PREPARE upsert_order AS
+    INSERT INTO orders ({', '.join(ORDER_COLUMNS)})
+    VALUES ({', '.join(f'${i}' for i in range(1, len(ORDER_COLUMNS) + 1))})
+    ON CONFLICT (shopify_order_id) DO UPDATE SET
+        {_ORDER_UPDATE_SET}
+    RETURNING id, shopify_order_id
+"""
+
+EXECUTE_UPSERT_ORDER_SQL = f"EXECUTE upsert_order ({', '.join(['%s'] * len(ORDER_COLUMNS))})"
+
+# Full syncs COPY each page into a staging table and merge it in one statement
+COPY_NULL = '\\N'
+
+CREATE_ORDERS_STAGE_SQL = f"""
+    CREATE TEMP TABLE IF NOT EXISTS orders_stage ON COMMIT DROP AS
+    SELECT {', '.join(ORDER_COLUMNS)} FROM orders WITH NO DATA
+"""
+
+MERGE_ORDERS_STAGE_SQL = f"""
+    INSERT INTO orders ({', '.join(ORDER_COLUMNS)})
+    SELECT {', '.join(ORDER_COLUMNS)} FROM orders_stage
+    ON CONFLICT (shopify_order_id) DO UPDATE SET
+        {_ORDER_UPDATE_SET}
+    RETURNING id, shopify_order_id
+"""
+
+# The sync's write path reads back thousands of rows per page (RETURNING ids,
+# existing hashes and options); a plain tuple cursor avoids building a dict per
+# row even when the connection defaults to RealDictCursor
+PAGE_CURSOR = psycopg2.extensions.cursor
+
+# Column order of the tuples built by OrdersSync._build_line_item_row
+LINE_ITEM_COLUMNS = (
+    'order_id', 'shopify_line_item_id', 'sku', 'product_id', 'variant_id',
+    'product_title', 'variant_title', 'quantity', 'price', 'total_discount',
+    'fulfillable_quantity', 'fulfillment_status', 'requires_shipping', 'grams',
+)
+
+# Line items are keyed by (order_id, shopify_line_item_id) so unchanged rows,
+# and local columns like picked/hs_code, survive a re-sync
+_LINE_ITEM_UPDATE_SET = ",\n        ".join(
+    f"{col} = EXCLUDED.{col}"
+    for col in LINE_ITEM_COLUMNS
+    if col not in ('order_id', 'shopify_line_item_id')
+)
+
+# Rows whose Shopify fields are unchanged are left alone (no new row version)
+_LINE_ITEM_SYNCED_COLUMNS = [col for col in LINE_ITEM_COLUMNS if col not in ('order_id', 'shopify_line_item_id')]
+_LINE_ITEM_CHANGED = (
+    f"({', '.join('order_line_items.' + col for col in _LINE_ITEM_SYNCED_COLUMNS)}) IS DISTINCT FROM "
+    f"({', '.join('EXCLUDED.' + col for col in _LINE_ITEM_SYNCED_COLUMNS)})"
+)
+
+UPSERT_LINE_ITEMS_SQL = f"""
+    INSERT INTO order_line_items ({', '.join(LINE_ITEM_COLUMNS)})
+    VALUES %s
+    ON CONFLICT (order_id, shopify_line_item_id) DO UPDATE SET
+        {_LINE_ITEM_UPDATE_SET}
+    WHERE {_LINE_ITEM_CHANGED}
+"""
+
+CREATE_LINE_ITEMS_STAGE_SQL = f"""
+    CREATE TEMP TABLE IF NOT EXISTS line_items_stage ON COMMIT DROP AS
+    SELECT {', '.join(LINE_ITEM_COLUMNS)} FROM order_line_items WITH NO DATA
+"""
+
+MERGE_LINE_ITEMS_STAGE_SQL = f"""
+    INSERT INTO order_line_items ({', '.join(LINE_ITEM_COLUMNS)})
+    SELECT {', '.join(LINE_ITEM_COLUMNS)} FROM line_items_stage
+    ON CONFLICT (order_id, shopify_line_item_id) DO UPDATE SET
+        {_LINE_ITEM_UPDATE_SET}
+    WHERE {_LINE_ITEM_CHANGED}
+"""
+
+
+def copy_rows(cursor, table: str, columns: Tuple[str, ...], rows: Iterable[Tuple]):
+    """COPY row tuples into a table as CSV, writing None as NULL."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow([COPY_NULL if value is None else value for value in row])
+    buf.seek(0)
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+        buf
+    )
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -305,169 +507,43 @@ body {
 }'''
 
 
+# Bump when the DDL in _create_orders_schema changes, so existing databases
+# run it again on the next boot
+ORDERS_SCHEMA_VERSION = 'orders_v2'
+
+
 def init_orders_tables(get_db_connection):
     """
     Initialize the orders tables if they don't exist.
     Called on app startup to ensure tables are ready.
+
+    The DDL only runs when schema_migrations doesn't record ORDERS_SCHEMA_VERSION
+    yet; a normal boot just checks the sentinel and resets any interrupted sync.
     """
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        # Create orders table
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS orders (
-                id SERIAL PRIMARY KEY,
-                shopify_order_id TEXT UNIQUE NOT NULL,
-                order_number TEXT NOT NULL,
-                customer_name TEXT,
-                customer_email TEXT,
-                customer_phone TEXT,
-                shipping_address TEXT,
-                billing_address TEXT,
-                note TEXT,
-                note_attributes TEXT,
-                total_price REAL,
-                subtotal_price REAL,
-                total_tax REAL,
-                total_shipping REAL,
-                currency TEXT DEFAULT 'CAD',
-                financial_status TEXT,
-                fulfillment_status TEXT,
-                tracking_number TEXT,
-                scanned_status INTEGER DEFAULT 0,
-                scanned_at TIMESTAMP,
-                shopify_created_at TIMESTAMP,
-                shopify_updated_at TIMESTAMP,
-                synced_at TIMESTAMP,
-                cancelled_at TIMESTAMP,
-                cancel_reason TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        # Create indexes for orders
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_order_number ON orders(order_number)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_shopify_order_id ON orders(shopify_order_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_customer_email ON orders(customer_email)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_tracking ON orders(tracking_number)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_fulfillment ON orders(fulfillment_status)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_scanned ON orders(scanned_status)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_shopify_updated ON orders(shopify_updated_at)")
-
-        # Add total_weight_grams column if it doesn't exist (migration)
-        cursor.execute("""
-            DO $$
-            BEGIN
-                IF NOT EXISTS (SELECT 1 FROM information_schema.columns
-                               WHERE table_name = 'orders' AND column_name = 'total_weight_grams') THEN
-                    ALTER TABLE orders ADD COLUMN total_weight_grams INTEGER DEFAULT 0;
-                END IF;
-            END $$;
-        """)
-
-        # Create order_line_items table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS order_line_items (
-                id SERIAL PRIMARY KEY,
-                order_id INTEGER NOT NULL,
-                shopify_line_item_id TEXT,
-                sku TEXT,
-                product_id TEXT,
-                variant_id TEXT,
-                product_title TEXT,
-                variant_title TEXT,
-                quantity INTEGER DEFAULT 1,
-                price REAL,
-                total_discount REAL DEFAULT 0,
-                fulfillable_quantity INTEGER,
-                fulfillment_status TEXT,
-                requires_shipping INTEGER DEFAULT 1,
-                grams INTEGER DEFAULT 0,
-                picked INTEGER DEFAULT 0,
-                picked_at TIMESTAMP,
-                FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                key TEXT PRIMARY KEY,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_line_items_order ON order_line_items(order_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_line_items_sku ON order_line_items(sku)")
+        cursor.execute("SELECT 1 FROM schema_migrations WHERE key = %s", (ORDERS_SCHEMA_VERSION,))
 
-        # Add grams column if it doesn't exist (migration)
-        cursor.execute("""
-            DO $$
-            BEGIN
-                IF NOT EXISTS (SELECT 1 FROM information_schema.columns
-                               WHERE table_name = 'order_line_items' AND column_name = 'grams') THEN
-                    ALTER TABLE order_line_items ADD COLUMN grams INTEGER DEFAULT 0;
-                END IF;
-            END $$;
-        """)
-
-        # Add customs-related columns if they don't exist (migration)
-        cursor.execute("""
-            DO $$
-            BEGIN
-                IF NOT EXISTS (SELECT 1 FROM information_schema.columns
-                               WHERE table_name = 'order_line_items' AND column_name = 'hs_code') THEN
-                    ALTER TABLE order_line_items ADD COLUMN hs_code TEXT;
-                END IF;
-                IF NOT EXISTS (SELECT 1 FROM information_schema.columns
-                               WHERE table_name = 'order_line_items' AND column_name = 'country_of_origin') THEN
-                    ALTER TABLE order_line_items ADD COLUMN country_of_origin TEXT DEFAULT 'CA';
-                END IF;
-                IF NOT EXISTS (SELECT 1 FROM information_schema.columns
-                               WHERE table_name = 'order_line_items' AND column_name = 'customs_description') THEN
-                    ALTER TABLE order_line_items ADD COLUMN customs_description TEXT;
-                END IF;
-            END $$;
-        """)
-
-        # Create order_line_item_options table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS order_line_item_options (
-                id SERIAL PRIMARY KEY,
-                line_item_id INTEGER NOT NULL,
-                name TEXT NOT NULL,
-                value TEXT,
-                FOREIGN KEY (line_item_id) REFERENCES order_line_items(id) ON DELETE CASCADE
-            )
-        """)
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_options_line_item ON order_line_item_options(line_item_id)")
-
-        # Create order_sync_status table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS order_sync_status (
-                id SERIAL PRIMARY KEY,
-                sync_type TEXT NOT NULL UNIQUE,
-                last_sync_at TIMESTAMP,
-                last_sync_count INTEGER DEFAULT 0,
-                status TEXT DEFAULT 'idle',
-                error_message TEXT,
-                current_page INTEGER DEFAULT 0,
-                synced_so_far INTEGER DEFAULT 0,
-                progress_message TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        # Add progress columns if they don't exist (migration for existing installs)
-        try:
-            cursor.execute("ALTER TABLE order_sync_status ADD COLUMN IF NOT EXISTS current_page INTEGER DEFAULT 0")
-            cursor.execute("ALTER TABLE order_sync_status ADD COLUMN IF NOT EXISTS synced_so_far INTEGER DEFAULT 0")
-            cursor.execute("ALTER TABLE order_sync_status ADD COLUMN IF NOT EXISTS progress_message TEXT")
-            cursor.execute("ALTER TABLE order_sync_status ADD COLUMN IF NOT EXISTS page_cursor TEXT")
-            cursor.execute("ALTER TABLE order_sync_status ADD COLUMN IF NOT EXISTS sync_params TEXT")
-        except:
-            pass  # Columns might already exist
-
-        # Insert initial sync status record if it doesn't exist
-        cursor.execute("""
-            INSERT INTO order_sync_status (sync_type, status)
-            VALUES ('shopify_orders', 'idle')
-            ON CONFLICT (sync_type) DO NOTHING
-        """)
+        if not cursor.fetchone():
+            # Apply the schema in one transaction; the advisory lock keeps
+            # several workers booting at once from running it concurrently
+            conn.autocommit = False
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext('init_orders_tables'))")
+            cursor.execute("SELECT 1 FROM schema_migrations WHERE key = %s", (ORDERS_SCHEMA_VERSION,))
+            if not cursor.fetchone():
+                _create_orders_schema(cursor)
+                cursor.execute("INSERT INTO schema_migrations (key) VALUES (%s)", (ORDERS_SCHEMA_VERSION,))
+                print(f"✓ Applied orders schema {ORDERS_SCHEMA_VERSION}")
+            conn.commit()
+            conn.autocommit = True
 
         # Reset any stuck "running" status (from interrupted syncs)
         cursor.execute("""
@@ -478,165 +554,360 @@ def init_orders_tables(get_db_connection):
             WHERE sync_type = 'shopify_orders' AND status = 'running'
         """)
 
-        # Update cancelled_orders table if it exists but lacks columns
-        # First check if table exists
-        cursor.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables
-                WHERE table_name = 'cancelled_orders'
-            )
-        """)
-        table_exists = cursor.fetchone()
+        cursor.close()
+        conn.close()
+        print("✓ Orders tables initialized")
 
-        if not table_exists or not table_exists.get('exists', False):
-            # Create cancelled_orders table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS cancelled_orders (
-                    id SERIAL PRIMARY KEY,
-                    order_id INTEGER,
-                    shopify_order_id TEXT,
-                    order_number TEXT NOT NULL,
-                    tracking_number TEXT,
-                    customer_name TEXT,
-                    customer_email TEXT,
-                    reason TEXT NOT NULL,
-                    reason_notes TEXT,
-                    cancelled_by TEXT,
-                    refund_amount REAL,
-                    refund_issued INTEGER DEFAULT 0,
-                    shopify_refund_id TEXT,
-                    refunded_at TIMESTAMP,
-                    shipstation_voided INTEGER DEFAULT 0,
-                    shipstation_shipment_id TEXT,
-                    shipstation_void_response TEXT,
-                    cancelled_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE SET NULL
-                )
-            """)
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_cancelled_order_number ON cancelled_orders(order_number)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_cancelled_shopify_id ON cancelled_orders(shopify_order_id)")
+    except Exception as e:
+        print(f"❌ Error initializing orders tables: {e}")
 
-        # Create order_batches table for grouping orders for fulfillment
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS order_batches (
-                id SERIAL PRIMARY KEY,
-                name TEXT,
-                status TEXT DEFAULT 'pending',
-                notes TEXT,
-                created_by TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
 
-        # Create order_batch_items table (links orders to batches)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS order_batch_items (
-                id SERIAL PRIMARY KEY,
-                batch_id INTEGER NOT NULL,
-                order_id INTEGER NOT NULL,
-                order_number TEXT NOT NULL,
-                status TEXT DEFAULT 'pending',
-                notes TEXT,
-                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (batch_id) REFERENCES order_batches(id) ON DELETE CASCADE,
-                FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE,
-                UNIQUE(batch_id, order_id)
-            )
-        """)
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_batch_items_batch ON order_batch_items(batch_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_batch_items_order ON order_batch_items(order_id)")
-
-        # Create app_settings table for packing slips, logos, and other configurations
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS app_settings (
-                id SERIAL PRIMARY KEY,
-                setting_key TEXT UNIQUE NOT NULL,
-                setting_value TEXT,
-                setting_type TEXT DEFAULT 'text',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_app_settings_key ON app_settings(setting_key)")
-
-        # Insert default packing slip settings if they don't exist
-        default_settings = [
-            ('packing_slip_html', DEFAULT_PACKING_SLIP_HTML, 'html'),
-            ('packing_slip_css', DEFAULT_PACKING_SLIP_CSS, 'css'),
-            ('packing_slip_js', '', 'js'),
-            ('packing_slip_label_width', '4', 'number'),
-            ('packing_slip_label_height', '6', 'number'),
-            ('company_logo_url', '', 'url'),
-            ('company_name', 'Hemlock & Oak', 'text'),
-            ('company_address', '', 'text'),
-            ('company_phone', '', 'text'),
-            ('company_email', '', 'text'),
-        ]
-        for key, value, stype in default_settings:
-            cursor.execute("""
-                INSERT INTO app_settings (setting_key, setting_value, setting_type)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (setting_key) DO NOTHING
-            """, (key, value, stype))
+# Columns added to order_sync_status after its first release
+SYNC_STATUS_MIGRATION_COLUMNS = {
+    'current_page': 'INTEGER DEFAULT 0',
+    'synced_so_far': 'INTEGER DEFAULT 0',
+    'progress_message': 'TEXT',
+    'page_cursor': 'TEXT',
+    'sync_params': 'TEXT',
+}
 
-        # Create product_customs_info table for default customs data per SKU
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS product_customs_info (
-                id SERIAL PRIMARY KEY,
-                sku TEXT UNIQUE NOT NULL,
-                product_title TEXT,
-                customs_description TEXT NOT NULL,
-                hs_code TEXT NOT NULL,
-                hs_code_us TEXT,
-                country_of_origin TEXT DEFAULT 'CA',
-                weight_grams INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_product_customs_sku ON product_customs_info(sku)")
 
-        # Create hs_code_reference table for common HS codes lookup
+def _create_orders_schema(cursor):
+    """Create or migrate the orders, sync status, batch and settings tables."""
+    # Create orders table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS orders (
+            id SERIAL PRIMARY KEY,
+            shopify_order_id TEXT UNIQUE NOT NULL,
+            order_number TEXT NOT NULL,
+            customer_name TEXT,
+            customer_email TEXT,
+            customer_phone TEXT,
+            shipping_address TEXT,
+            billing_address TEXT,
+            note TEXT,
+            note_attributes TEXT,
+            total_price REAL,
+            subtotal_price REAL,
+            total_tax REAL,
+            total_shipping REAL,
+            currency TEXT DEFAULT 'CAD',
+            financial_status TEXT,
+            fulfillment_status TEXT,
+            tracking_number TEXT,
+            scanned_status INTEGER DEFAULT 0,
+            scanned_at TIMESTAMP,
+            shopify_created_at TIMESTAMP,
+            shopify_updated_at TIMESTAMP,
+            synced_at TIMESTAMP,
+            cancelled_at TIMESTAMP,
+            cancel_reason TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Create indexes for orders
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_order_number ON orders(order_number)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_customer_email ON orders(customer_email)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_tracking ON orders(tracking_number)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_fulfillment ON orders(fulfillment_status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_scanned ON orders(scanned_status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_shopify_updated ON orders(shopify_updated_at)")
+
+    # shopify_order_id's UNIQUE constraint already indexes it; this copy only added write cost
+    cursor.execute("DROP INDEX IF EXISTS idx_orders_shopify_order_id")
+
+    # Add content_hash and total_weight_grams columns if they don't exist (migration)
+    cursor.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                           WHERE table_name = 'orders' AND column_name = 'content_hash') THEN
+                ALTER TABLE orders ADD COLUMN content_hash TEXT;
+            END IF;
+            IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                           WHERE table_name = 'orders' AND column_name = 'total_weight_grams') THEN
+                ALTER TABLE orders ADD COLUMN total_weight_grams INTEGER DEFAULT 0;
+            END IF;
+        END $$;
+    """)
+
+    # Create order_line_items table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS order_line_items (
+            id SERIAL PRIMARY KEY,
+            order_id INTEGER NOT NULL,
+            shopify_line_item_id TEXT,
+            sku TEXT,
+            product_id TEXT,
+            variant_id TEXT,
+            product_title TEXT,
+            variant_title TEXT,
+            quantity INTEGER DEFAULT 1,
+            price REAL,
+            total_discount REAL DEFAULT 0,
+            fulfillable_quantity INTEGER,
+            fulfillment_status TEXT,
+            requires_shipping INTEGER DEFAULT 1,
+            grams INTEGER DEFAULT 0,
+            picked INTEGER DEFAULT 0,
+            picked_at TIMESTAMP,
+            FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_line_items_order ON order_line_items(order_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_line_items_sku ON order_line_items(sku)")
+
+    # Unique key for line item upserts (migration: drop duplicates first)
+    cursor.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_indexes
+                           WHERE indexname = 'idx_line_items_order_shopify') THEN
+                DELETE FROM order_line_items a
+                USING order_line_items b
+                WHERE a.order_id = b.order_id
+                  AND a.shopify_line_item_id = b.shopify_line_item_id
+                  AND a.id > b.id;
+                CREATE UNIQUE INDEX idx_line_items_order_shopify
+                    ON order_line_items(order_id, shopify_line_item_id);
+            END IF;
+        END $$;
+    """)
+
+    # Add grams and customs-related columns if they don't exist (migration)
+    cursor.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                           WHERE table_name = 'order_line_items' AND column_name = 'grams') THEN
+                ALTER TABLE order_line_items ADD COLUMN grams INTEGER DEFAULT 0;
+            END IF;
+            IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                           WHERE table_name = 'order_line_items' AND column_name = 'hs_code') THEN
+                ALTER TABLE order_line_items ADD COLUMN hs_code TEXT;
+            END IF;
+            IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                           WHERE table_name = 'order_line_items' AND column_name = 'country_of_origin') THEN
+                ALTER TABLE order_line_items ADD COLUMN country_of_origin TEXT DEFAULT 'CA';
+            END IF;
+            IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                           WHERE table_name = 'order_line_items' AND column_name = 'customs_description') THEN
+                ALTER TABLE order_line_items ADD COLUMN customs_description TEXT;
+            END IF;
+        END $$;
+    """)
+
+    # Create order_line_item_options table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS order_line_item_options (
+            id SERIAL PRIMARY KEY,
+            line_item_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            value TEXT,
+            FOREIGN KEY (line_item_id) REFERENCES order_line_items(id) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_options_line_item ON order_line_item_options(line_item_id)")
+
+    # Create order_sync_status table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS order_sync_status (
+            id SERIAL PRIMARY KEY,
+            sync_type TEXT NOT NULL UNIQUE,
+            last_sync_at TIMESTAMP,
+            last_sync_count INTEGER DEFAULT 0,
+            status TEXT DEFAULT 'idle',
+            error_message TEXT,
+            current_page INTEGER DEFAULT 0,
+            synced_so_far INTEGER DEFAULT 0,
+            progress_message TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Add progress columns if they don't exist (migration for existing installs)
+    cursor.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_name = 'order_sync_status'
+    """)
+    existing = {row['column_name'] for row in cursor.fetchall()}
+    missing = [
+        f"ALTER TABLE order_sync_status ADD COLUMN IF NOT EXISTS {name} {col_type}"
+        for name, col_type in SYNC_STATUS_MIGRATION_COLUMNS.items()
+        if name not in existing
+    ]
+    if missing:
+        cursor.execute(";\n".join(missing))
+
+    # Insert initial sync status record if it doesn't exist
+    cursor.execute("""
+        INSERT INTO order_sync_status (sync_type, status)
+        VALUES ('shopify_orders', 'idle')
+        ON CONFLICT (sync_type) DO NOTHING
+    """)
+
+    # Update cancelled_orders table if it exists but lacks columns
+    # First check if table exists
+    cursor.execute("""
+        SELECT EXISTS (
+            SELECT FROM information_schema.tables
+            WHERE table_name = 'cancelled_orders'
+        )
+    """)
+    table_exists = cursor.fetchone()
+
+    if not table_exists or not table_exists.get('exists', False):
+        # Create cancelled_orders table
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS hs_code_reference (
+            CREATE TABLE IF NOT EXISTS cancelled_orders (
                 id SERIAL PRIMARY KEY,
-                hs_code TEXT NOT NULL,
-                description TEXT,
-                category TEXT,
-                notes TEXT
+                order_id INTEGER,
+                shopify_order_id TEXT,
+                order_number TEXT NOT NULL,
+                tracking_number TEXT,
+                customer_name TEXT,
+                customer_email TEXT,
+                reason TEXT NOT NULL,
+                reason_notes TEXT,
+                cancelled_by TEXT,
+                refund_amount REAL,
+                refund_issued INTEGER DEFAULT 0,
+                shopify_refund_id TEXT,
+                refunded_at TIMESTAMP,
+                shipstation_voided INTEGER DEFAULT 0,
+                shipstation_shipment_id TEXT,
+                shipstation_void_response TEXT,
+                cancelled_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE SET NULL
             )
         """)
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_hs_code_reference_code ON hs_code_reference(hs_code)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_hs_code_reference_category ON hs_code_reference(category)")
-
-        # Insert default HS codes for common stationery products
-        default_hs_codes = [
-            ('4820102010', 'Bound diaries, planners, agendas', 'Planners', 'Paper/cardboard-bound day planners and appointment books'),
-            ('4820109000', 'Notebooks, notepads, memo pads', 'Notebooks', 'Other paper/cardboard notebooks and note pads'),
-            ('4911910000', 'Printed pictures, designs, photographs', 'Stickers', 'Printed pictures, designs and photographs'),
-            ('4821100000', 'Paper labels, printed', 'Labels', 'Printed paper or paperboard labels'),
-            ('4911990000', 'Other printed matter', 'Printed Goods', 'Other printed matter n.e.s.'),
-            ('9608100000', 'Ball point pens', 'Pens', 'Ball point pens'),
-            ('9608200000', 'Felt tipped markers and pens', 'Pens', 'Felt tipped and other porous-tipped pens and markers'),
-            ('4817100000', 'Envelopes of paper', 'Paper Goods', 'Paper or paperboard envelopes'),
-            ('4823909000', 'Other articles of paper/paperboard', 'Paper Goods', 'Other articles of paper pulp, paper or paperboard'),
-            ('3926909990', 'Articles of plastics n.e.s.', 'Plastic Goods', 'Other articles of plastics'),
-        ]
-        for hs_code, description, category, notes in default_hs_codes:
-            cursor.execute("""
-                INSERT INTO hs_code_reference (hs_code, description, category, notes)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT DO NOTHING
-            """, (hs_code, description, category, notes))
-
-        conn.commit()
-        cursor.close()
-        conn.close()
-        print("✓ Orders tables initialized")
-
-    except Exception as e:
-        print(f"❌ Error initializing orders tables: {e}")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cancelled_order_number ON cancelled_orders(order_number)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cancelled_shopify_id ON cancelled_orders(shopify_order_id)")
+
+    # Create order_batches table for grouping orders for fulfillment
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS order_batches (
+            id SERIAL PRIMARY KEY,
+            name TEXT,
+            status TEXT DEFAULT 'pending',
+            notes TEXT,
+            created_by TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Create order_batch_items table (links orders to batches)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS order_batch_items (
+            id SERIAL PRIMARY KEY,
+            batch_id INTEGER NOT NULL,
+            order_id INTEGER NOT NULL,
+            order_number TEXT NOT NULL,
+            status TEXT DEFAULT 'pending',
+            notes TEXT,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (batch_id) REFERENCES order_batches(id) ON DELETE CASCADE,
+            FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE,
+            UNIQUE(batch_id, order_id)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_batch_items_batch ON order_batch_items(batch_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_batch_items_order ON order_batch_items(order_id)")
+
+    # Create app_settings table for packing slips, logos, and other configurations
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS app_settings (
+            id SERIAL PRIMARY KEY,
+            setting_key TEXT UNIQUE NOT NULL,
+            setting_value TEXT,
+            setting_type TEXT DEFAULT 'text',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_app_settings_key ON app_settings(setting_key)")
+
+    # Insert default packing slip settings if they don't exist
+    default_settings = [
+        ('packing_slip_html', DEFAULT_PACKING_SLIP_HTML, 'html'),
+        ('packing_slip_css', DEFAULT_PACKING_SLIP_CSS, 'css'),
+        ('packing_slip_js', '', 'js'),
+        ('packing_slip_label_width', '4', 'number'),
+        ('packing_slip_label_height', '6', 'number'),
+        ('company_logo_url', '', 'url'),
+        ('company_name', 'Hemlock & Oak', 'text'),
+        ('company_address', '', 'text'),
+        ('company_phone', '', 'text'),
+        ('company_email', '', 'text'),
+    ]
+    # Only ship the multi-KB template defaults when a key is actually missing
+    cursor.execute(
+        "SELECT setting_key FROM app_settings WHERE setting_key = ANY(%s)",
+        ([key for key, _, _ in default_settings],)
+    )
+    present = {row['setting_key'] for row in cursor.fetchall()}
+    missing_settings = [row for row in default_settings if row[0] not in present]
+    if missing_settings:
+        execute_values(cursor, """
+            INSERT INTO app_settings (setting_key, setting_value, setting_type)
+            VALUES %s
+            ON CONFLICT (setting_key) DO NOTHING
+        """, missing_settings)
+
+    # Create product_customs_info table for default customs data per SKU
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS product_customs_info (
+            id SERIAL PRIMARY KEY,
+            sku TEXT UNIQUE NOT NULL,
+            product_title TEXT,
+            customs_description TEXT NOT NULL,
+            hs_code TEXT NOT NULL,
+            hs_code_us TEXT,
+            country_of_origin TEXT DEFAULT 'CA',
+            weight_grams INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_product_customs_sku ON product_customs_info(sku)")
+
+    # Create hs_code_reference table for common HS codes lookup
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS hs_code_reference (
+            id SERIAL PRIMARY KEY,
+            hs_code TEXT NOT NULL,
+            description TEXT,
+            category TEXT,
+            notes TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_hs_code_reference_code ON hs_code_reference(hs_code)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_hs_code_reference_category ON hs_code_reference(category)")
+
+    # Insert default HS codes for common stationery products
+    default_hs_codes = [
+        ('4820102010', 'Bound diaries, planners, agendas', 'Planners', 'Paper/cardboard-bound day planners and appointment books'),
+        ('4820109000', 'Notebooks, notepads, memo pads', 'Notebooks', 'Other paper/cardboard notebooks and note pads'),
+        ('4911910000', 'Printed pictures, designs, photographs', 'Stickers', 'Printed pictures, designs and photographs'),
+        ('4821100000', 'Paper labels, printed', 'Labels', 'Printed paper or paperboard labels'),
+        ('4911990000', 'Other printed matter', 'Printed Goods', 'Other printed matter n.e.s.'),
+        ('9608100000', 'Ball point pens', 'Pens', 'Ball point pens'),
+        ('9608200000', 'Felt tipped markers and pens', 'Pens', 'Felt tipped and other porous-tipped pens and markers'),
+        ('4817100000', 'Envelopes of paper', 'Paper Goods', 'Paper or paperboard envelopes'),
+        ('4823909000', 'Other articles of paper/paperboard', 'Paper Goods', 'Other articles of paper pulp, paper or paperboard'),
+        ('3926909990', 'Articles of plastics n.e.s.', 'Plastic Goods', 'Other articles of plastics'),
+    ]
+    # hs_code has no unique constraint for ON CONFLICT to use, so skip codes already present
+    execute_values(cursor, """
+        INSERT INTO hs_code_reference (hs_code, description, category, notes)
+        SELECT v.hs_code, v.description, v.category, v.notes
+        FROM (VALUES %s) AS v(hs_code, description, category, notes)
+        WHERE NOT EXISTS (SELECT 1 FROM hs_code_reference h WHERE h.hs_code = v.hs_code)
+    """, default_hs_codes)
 
 
 class OrdersSync:
@@ -644,6 +915,18 @@ class OrdersSync:
     Handles syncing orders from Shopify to local database.
     """
 
+    # Seconds a last_sync_at read is reused before hitting the database again
+    LAST_SYNC_CACHE_TTL = 30
+
+    # Orders written per transaction during a sync (pages are 250 orders)
+    COMMIT_EVERY = 1000
+
+    # Commit (and so publish progress) at least this often, even on slow pages
+    PROGRESS_FLUSH_SECONDS = 10
+
+    # A 'running' sync not updated for this long is treated as interrupted
+    STALE_SYNC_MINUTES = 2
+
     def __init__(self, shopify_api, get_db_connection):
         """
         Initialize the orders sync service.
@@ -655,105 +938,163 @@ class OrdersSync:
         self.shopify = shopify_api
         self.get_db_connection = get_db_connection
 
-    def get_last_sync_time(self) -> Optional[datetime]:
-        """Get the last successful sync time from database."""
-        try:
-            conn = self.get_db_connection()
+        # (last_sync_at, time.monotonic() when cached)
+        self._last_sync_cache: Optional[Tuple[Optional[datetime], float]] = None
+
+    @contextmanager
+    def _connection(self, conn=None):
+        """
+        Yield `conn` if one is passed in, otherwise a fresh connection that is
+        closed afterwards. Lets sync_orders share its connection with the
+        status helpers while other callers keep working unchanged.
+
+        A shared connection may hold the caller's uncommitted orders, so the
+        helper runs inside a savepoint and a failure only undoes its own work.
+        """
+        if conn is not None:
+            if conn.autocommit:
+                yield conn
+                return
+
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT last_sync_at FROM order_sync_status
-                WHERE sync_type = 'shopify_orders'
-            """)
-            row = cursor.fetchone()
-            cursor.close()
+            cursor.execute("SAVEPOINT sync_helper")
+            try:
+                yield conn
+            except Exception:
+                # Unless the helper got as far as committing, undo just its statements
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    cursor.execute("ROLLBACK TO SAVEPOINT sync_helper")
+                    cursor.execute("RELEASE SAVEPOINT sync_helper")
+                raise
+            else:
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    cursor.execute("RELEASE SAVEPOINT sync_helper")
+            finally:
+                cursor.close()
+            return
+
+        conn = self.get_db_connection()
+        try:
+            yield conn
+        finally:
             conn.close()
 
-            if row and row.get('last_sync_at'):
-                return row['last_sync_at']
-            return None
+    def get_last_sync_time(self, conn=None) -> Optional[datetime]:
+        """Get the last successful sync time (cached for LAST_SYNC_CACHE_TTL seconds)."""
+        if self._last_sync_cache:
+            value, cached_at = self._last_sync_cache
+            if time.monotonic() - cached_at < self.LAST_SYNC_CACHE_TTL:
+                return value
+
+        try:
+            with self._connection(conn) as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT last_sync_at FROM order_sync_status
+                    WHERE sync_type = 'shopify_orders'
+                """)
+                row = cursor.fetchone()
+                cursor.close()
+
+            last_sync_at = row.get('last_sync_at') if row else None
+            self._last_sync_cache = (last_sync_at, time.monotonic())
+            return last_sync_at
         except Exception as e:
             print(f"Error getting last sync time: {e}")
             return None
 
-    def update_sync_status(self, status: str, count: int = 0, error: str = None):
-        """Update the sync status in database."""
+    def update_sync_status(self, status: str, count: int = 0, error: str = None, conn=None,
+                           sync_params: Dict = None):
+        """Update the sync status in database.
+
+        When starting a run, `sync_params` is stored in the same UPDATE so a
+        later resume knows the time window it was working on.
+        """
         try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
+            with self._connection(conn) as conn:
+                cursor = conn.cursor()
 
-            if status == 'completed':
-                cursor.execute("""
-                    UPDATE order_sync_status
-                    SET status = 'idle',
-                        last_sync_at = CURRENT_TIMESTAMP,
-                        last_sync_count = %s,
-                        error_message = NULL,
-                        current_page = 0,
-                        synced_so_far = 0,
-                        progress_message = 'Completed',
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE sync_type = 'shopify_orders'
-                """, (count,))
-            elif status == 'running':
-                cursor.execute("""
-                    UPDATE order_sync_status
-                    SET status = 'running',
-                        error_message = NULL,
-                        current_page = 0,
-                        synced_so_far = 0,
-                        progress_message = 'Starting sync...',
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE sync_type = 'shopify_orders'
-                """)
-            elif status == 'error':
-                cursor.execute("""
-                    UPDATE order_sync_status
-                    SET status = 'error',
-                        error_message = %s,
-                        progress_message = %s,
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE sync_type = 'shopify_orders'
-                """, (error, f"Error: {error}"))
+                if status == 'completed':
+                    cursor.execute("""
+                        UPDATE order_sync_status
+                        SET status = 'idle',
+                            last_sync_at = CURRENT_TIMESTAMP,
+                            last_sync_count = %s,
+                            error_message = NULL,
+                            current_page = 0,
+                            synced_so_far = 0,
+                            progress_message = 'Completed',
+                            updated_at = CURRENT_TIMESTAMP
+                        WHERE sync_type = 'shopify_orders'
+                        RETURNING last_sync_at
+                    """, (count,))
+                    row = cursor.fetchone()
+                    if row:
+                        self._last_sync_cache = (row['last_sync_at'], time.monotonic())
+                elif status == 'running':
+                    cursor.execute("""
+                        UPDATE order_sync_status
+                        SET status = 'running',
+                            error_message = NULL,
+                            current_page = 0,
+                            synced_so_far = 0,
+                            progress_message = 'Starting sync...',
+                            sync_params = COALESCE(%s, sync_params),
+                            updated_at = CURRENT_TIMESTAMP
+                        WHERE sync_type = 'shopify_orders'
+                    """, (json_dumps(sync_params) if sync_params is not None else None,))
+                elif status == 'error':
+                    cursor.execute("""
+                        UPDATE order_sync_status
+                        SET status = 'error',
+                            error_message = %s,
+                            progress_message = %s,
+                            updated_at = CURRENT_TIMESTAMP
+                        WHERE sync_type = 'shopify_orders'
+                    """, (error, f"Error: {error}"))
 
-            conn.commit()
-            cursor.close()
-            conn.close()
+                conn.commit()
+                cursor.close()
         except Exception as e:
             print(f"Error updating sync status: {e}")
 
-    def update_sync_progress(self, page: int, synced: int, message: str, page_cursor: str = None):
-        """Update sync progress in database (called after each page)."""
+    def update_sync_progress(self, page: int, synced: int, message: str, page_cursor: str = None,
+                             conn=None, commit: bool = True):
+        """
+        Update sync progress in database (called when a sync commits).
+
+        Pass commit=False to leave the update in the caller's open transaction.
+        """
         try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("""
-                UPDATE order_sync_status
-                SET current_page = %s,
-                    synced_so_far = %s,
-                    progress_message = %s,
-                    page_cursor = %s,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE sync_type = 'shopify_orders'
-            """, (page, synced, message, page_cursor))
-            conn.commit()
-            cursor.close()
-            conn.close()
+            with self._connection(conn) as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    UPDATE order_sync_status
+                    SET current_page = %s,
+                        synced_so_far = %s,
+                        progress_message = %s,
+                        page_cursor = %s,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE sync_type = 'shopify_orders'
+                """, (page, synced, message, page_cursor))
+                if commit:
+                    conn.commit()
+                cursor.close()
         except Exception as e:
             print(f"Error updating sync progress: {e}")
 
-    def get_interrupted_sync(self) -> Optional[Dict]:
+    def get_interrupted_sync(self, conn=None) -> Optional[Dict]:
         """Check if there's an interrupted sync that can be resumed."""
         try:
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT status, current_page, synced_so_far, page_cursor, sync_params, updated_at
-                FROM order_sync_status
-                WHERE sync_type = 'shopify_orders'
-            """)
-            row = cursor.fetchone()
-            cursor.close()
-            conn.close()
+            with self._connection(conn) as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT status, current_page, synced_so_far, page_cursor, sync_params, updated_at
+                    FROM order_sync_status
+                    WHERE sync_type = 'shopify_orders'
+                """)
+                row = cursor.fetchone()
+                cursor.close()
 
             if row and row.get('status') == 'running':
                 # Check if the sync was updated recently (within 5 minutes)
@@ -763,7 +1104,7 @@ class OrdersSync:
                     if updated_at.tzinfo is None:
                         updated_at = updated_at.replace(tzinfo=timezone.utc)
                     age_minutes = (datetime.now(timezone.utc) - updated_at).total_seconds() / 60
-                    if age_minutes > 2 and row.get('page_cursor'):
+                    if age_minutes > self.STALE_SYNC_MINUTES and row.get('page_cursor'):
                         # Sync was interrupted, return resume info
                         return {
                             'page': row.get('current_page', 1),
@@ -776,6 +1117,34 @@ class OrdersSync:
             print(f"Error checking interrupted sync: {e}")
             return None
 
+    def _claim_sync(self, conn) -> bool:
+        """
+        Lock the sync status row for the caller's transaction.
+
+        Returns False if another sync holds the row or is still actively
+        running (updated within STALE_SYNC_MINUTES). The lock is released
+        when the caller commits its 'running' status.
+        """
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT status, updated_at FROM order_sync_status
+            WHERE sync_type = 'shopify_orders'
+            FOR UPDATE SKIP LOCKED
+        """)
+        row = cursor.fetchone()
+        cursor.close()
+
+        if row is None:
+            return False
+        if row.get('status') == 'running' and row.get('updated_at'):
+            updated_at = row['updated_at']
+            if updated_at.tzinfo is None:
+                updated_at = updated_at.replace(tzinfo=timezone.utc)
+            age_minutes = (datetime.now(timezone.utc) - updated_at).total_seconds() / 60
+            if age_minutes <= self.STALE_SYNC_MINUTES:
+                return False
+        return True
+
     def sync_orders(self, full_sync: bool = False, days_back: int = 90, resume: bool = True) -> Tuple[int, str]:
         """
         Sync orders from Shopify API to local database.
@@ -791,164 +1160,140 @@ class OrdersSync:
         Returns:
             Tuple of (orders_synced, status_message)
         """
-        # Check for interrupted sync that can be resumed
-        interrupted = None
-        if resume:
-            interrupted = self.get_interrupted_sync()
-            if interrupted and interrupted.get('page_cursor'):
-                sync_log(f"Found interrupted sync at page {interrupted.get('page')}, will resume...")
-
-        if interrupted and interrupted.get('page_cursor'):
-            # Resume from interrupted sync
-            synced_count = interrupted.get('synced_so_far', 0)
-            page = interrupted.get('page', 1)
-            page_info = interrupted.get('page_cursor')
-            sync_params = interrupted.get('sync_params', {})
-            updated_at_min_str = sync_params.get('updated_at_min')
-
-            sync_log(f"RESUMING sync from page {page}, already synced {synced_count} orders")
-            self.update_sync_progress(page, synced_count, f"Resuming from page {page}...")
-        else:
-            # Start fresh sync
-            sync_log(f"STARTING orders sync (full_sync={full_sync}, days_back={days_back})")
-            self.update_sync_status('running')
-            synced_count = 0
-            page = 1
-            page_info = None
-
-            # Determine time range
-            if full_sync:
-                updated_at_min = datetime.now(timezone.utc) - timedelta(days=days_back)
-                sync_log(f"Full sync: fetching orders from last {days_back} days")
-            else:
-                last_sync = self.get_last_sync_time()
-                if last_sync:
-                    if last_sync.tzinfo is None:
-                        last_sync = last_sync.replace(tzinfo=timezone.utc)
-                    updated_at_min = last_sync
-                    sync_log(f"Incremental sync: orders updated since {last_sync.strftime('%Y-%m-%d %H:%M')}")
-                else:
-                    updated_at_min = datetime.now(timezone.utc) - timedelta(days=30)
-                    sync_log(f"First sync: fetching orders from last 30 days")
-
-            updated_at_min_str = updated_at_min.isoformat()
-
-            # Save sync params for potential resume
-            sync_params = {
-                'full_sync': full_sync,
-                'days_back': days_back,
-                'updated_at_min': updated_at_min_str
-            }
-            try:
-                conn_tmp = self.get_db_connection()
-                cursor_tmp = conn_tmp.cursor()
-                cursor_tmp.execute("""
-                    UPDATE order_sync_status
-                    SET sync_params = %s
-                    WHERE sync_type = 'shopify_orders'
-                """, (json.dumps(sync_params),))
-                conn_tmp.commit()
-                cursor_tmp.close()
-                conn_tmp.close()
-            except Exception as e:
-                sync_log(f"Warning: Error saving sync params: {e}")
-
         conn = None
         error_count = 0
+        uncommitted = 0  # orders written since the last commit
+        last_flush = time.monotonic()
 
         try:
-            # Get a single connection for all upserts
+            # One connection for status bookkeeping and all upserts
             conn = self.get_db_connection()
             conn.autocommit = False
 
+            # Lock the status row until this run is marked running, so the
+            # background loop and a manual sync can't both start at once
+            if not self._claim_sync(conn):
+                sync_log("Another orders sync is already running, skipping")
+                return 0, "Sync already in progress"
+
+            # Check for interrupted sync that can be resumed
+            interrupted = None
+            if resume:
+                interrupted = self.get_interrupted_sync(conn=conn)
+                if interrupted and interrupted.get('page_cursor'):
+                    sync_log(f"Found interrupted sync at page {interrupted.get('page')}, will resume...")
+
+            if interrupted and interrupted.get('page_cursor'):
+                # Resume from interrupted sync
+                synced_count = interrupted.get('synced_so_far', 0)
+                page = interrupted.get('page', 1)
+                page_info = interrupted.get('page_cursor')
+                sync_params = interrupted.get('sync_params', {})
+                updated_at_min_str = sync_params.get('updated_at_min')
+
+                sync_log(f"RESUMING sync from page {page}, already synced {synced_count} orders")
+                self.update_sync_progress(page, synced_count, f"Resuming from page {page}...", page_info, conn=conn)
+            else:
+                # Start fresh sync
+                sync_log(f"STARTING orders sync (full_sync={full_sync}, days_back={days_back})")
+                synced_count = 0
+                page = 1
+                page_info = None
+
+                # Determine time range
+                if full_sync:
+                    updated_at_min = datetime.now(timezone.utc) - timedelta(days=days_back)
+                    sync_log(f"Full sync: fetching orders from last {days_back} days")
+                else:
+                    last_sync = self.get_last_sync_time(conn=conn)
+                    if last_sync:
+                        if last_sync.tzinfo is None:
+                            last_sync = last_sync.replace(tzinfo=timezone.utc)
+                        updated_at_min = last_sync
+                        sync_log(f"Incremental sync: orders updated since {last_sync.strftime('%Y-%m-%d %H:%M')}")
+                    else:
+                        updated_at_min = datetime.now(timezone.utc) - timedelta(days=30)
+                        sync_log(f"First sync: fetching orders from last 30 days")
+
+                updated_at_min_str = updated_at_min.isoformat()
+
+                # Save sync params for potential resume
+                sync_params = {
+                    'full_sync': full_sync,
+                    'days_back': days_back,
+                    'updated_at_min': updated_at_min_str
+                }
+                self.update_sync_status('running', conn=conn, sync_params=sync_params)
+
+            use_copy = bool(sync_params.get('full_sync'))
+
             # Build initial params - use both updated_at_min AND created_at_min
             # to catch both updated orders and brand new orders
             params = {
                 "status": "any",
                 "updated_at_min": updated_at_min_str,
                 "limit": 250,
-                "fields": "id,name,email,phone,total_price,subtotal_price,total_tax,"
-                          "shipping_lines,financial_status,fulfillment_status,fulfillments,"
-                          "line_items,shipping_address,billing_address,note,note_attributes,"
-                          "created_at,updated_at,cancelled_at,cancel_reason,customer"
+                "fields": ORDER_FIELDS
             }
 
-            while True:
-                sync_log(f"Fetching page {page}...")
-                if page == 1:
-                    sync_log(f"Query params: updated_at_min={updated_at_min_str}")
-                time.sleep(0.5)  # Rate limiting
-
-                if page_info:
-                    request_params = {"page_info": page_info, "limit": 250}
-                else:
-                    request_params = params
-
-                # Fetch page with retries
-                response = None
-                next_token = None
-                for retry in range(3):
-                    try:
-                        response, next_token = self.shopify._make_request("orders.json", params=request_params)
-                        if response:
-                            break
-                    except Exception as e:
-                        sync_log(f"Page {page} fetch error (attempt {retry + 1}/3): {e}")
-                        if retry < 2:
-                            time.sleep(min(2 ** retry, 8))
-
-                # Debug: Log what Shopify returned
-                if response:
-                    order_count = len(response.get("orders", []))
-                    sync_log(f"Shopify response: {order_count} orders in array")
-                else:
-                    sync_log(f"Shopify response: None or no 'orders' key")
-
-                if not response or "orders" not in response:
-                    sync_log(f"End of orders reached at page {page}")
-                    break
-
-                batch = response.get("orders", [])
-                if not batch:
-                    sync_log(f"Page {page}: Shopify returned empty orders array")
-                    break
+            # One synced_at/updated_at timestamp for every order written by this run
+            now = datetime.now(timezone.utc).isoformat()
 
+            # Fetch pages on a background thread so the next page downloads
+            # while the current one is written
+            for page, batch, next_token in prefetch(self._iter_sync_pages(params, page_info, page)):
                 sync_log(f"Page {page}: processing {len(batch)} orders...")
 
                 # Process this page immediately (don't accumulate)
-                for order in batch:
-                    try:
-                        self._upsert_order_with_conn(conn, order)
-                        synced_count += 1
-                    except Exception as e:
-                        error_count += 1
-                        sync_log(f"Error upserting order {order.get('id')}: {e}")
+                cursor = conn.cursor()
+                cursor.execute("SAVEPOINT sync_page")
+                try:
+                    synced_count += self._upsert_orders_bulk(
+                        conn, batch, use_copy=use_copy, skip_unchanged=not use_copy, now=now
+                    )
+                except Exception as e:
+                    # Fall back to order-by-order so one bad order doesn't sink the page.
+                    # Each order gets its own savepoint, so a failure only undoes that order.
+                    sync_log(f"Page {page}: bulk upsert failed ({e}), retrying order by order")
+                    cursor.execute("ROLLBACK TO SAVEPOINT sync_page")
+                    for order in batch:
+                        cursor.execute("SAVEPOINT sync_order")
                         try:
-                            conn.rollback()
-                        except:
-                            pass
-
-                # Commit after each page
-                conn.commit()
-                sync_log(f"Page {page}: committed (total: {synced_count} orders)")
-
-                # Update progress in database (so frontend can see it, and for resume)
-                # Save next_token as cursor for resume capability
-                self.update_sync_progress(page, synced_count, f"Page {page}: synced {synced_count} orders...", next_token)
+                            self._upsert_order_with_conn(conn, order, now)
+                            cursor.execute("RELEASE SAVEPOINT sync_order")
+                            synced_count += 1
+                        except Exception as e:
+                            error_count += 1
+                            sync_log(f"Error upserting order {order.get('id')}: {e}")
+                            cursor.execute("ROLLBACK TO SAVEPOINT sync_order")
+                # Don't leave one open savepoint per page until the next commit
+                cursor.execute("RELEASE SAVEPOINT sync_page")
+                cursor.close()
+
+                # Commit every COMMIT_EVERY orders (or PROGRESS_FLUSH_SECONDS) rather
+                # than after each page. Progress is only visible to the frontend and
+                # to resume once committed, so it is written just before each commit;
+                # next_token goes in the same transaction as the orders it follows,
+                # so a resume never skips uncommitted pages.
+                uncommitted += len(batch)
+                if (uncommitted >= self.COMMIT_EVERY or not next_token
+                        or time.monotonic() - last_flush >= self.PROGRESS_FLUSH_SECONDS):
+                    self.update_sync_progress(
+                        page, synced_count, f"Page {page}: synced {synced_count} orders...",
+                        next_token, conn=conn, commit=False
+                    )
+                    conn.commit()
+                    uncommitted = 0
+                    last_flush = time.monotonic()
+                    sync_log(f"Page {page}: committed (total: {synced_count} orders)")
 
                 # Clear batch from memory
                 del batch
 
-                if next_token:
-                    page_info = next_token
-                    page += 1
-                else:
-                    break
-
             if error_count > 0:
                 sync_log(f"Warning: {error_count} orders failed to sync")
 
-            self.update_sync_status('completed', synced_count)
+            self.update_sync_status('completed', synced_count, conn=conn)
             message = f"Synced {synced_count} orders successfully"
             sync_log(f"COMPLETED: {message}")
             return synced_count, message
@@ -958,6 +1303,7 @@ class OrdersSync:
             sync_log(f"ERROR: Orders sync failed: {error_msg}")
             import traceback
             traceback.print_exc()
+            # Fresh connection: the sync connection may be mid-transaction or broken
             self.update_sync_status('error', error=error_msg)
             return 0, f"Sync failed: {error_msg}"
         finally:
@@ -968,233 +1314,248 @@ class OrdersSync:
                 except:
                     pass
 
-    def _fetch_orders_from_shopify(self, updated_at_min: datetime) -> List[Dict]:
+    def _iter_sync_pages(self, params: Dict, page_info: Optional[str], page: int) -> Iterator[Tuple[int, List[Dict], Optional[str]]]:
         """
-        Fetch orders from Shopify API with pagination.
+        Fetch pages of orders for sync_orders, following Shopify's cursor.
 
         Args:
-            updated_at_min: Minimum updated_at timestamp
+            params: Query params for the first page
+            page_info: Cursor to start from instead (when resuming)
+            page: Page number of the first page fetched
 
-        Returns:
-            List of order dictionaries
+        Yields:
+            (page number, orders, next page cursor or None)
         """
-        orders = []
-        page_info = None
-        page = 1
-
-        # Build initial params
-        params = {
-            "status": "any",
-            "updated_at_min": updated_at_min.isoformat(),
-            "limit": 250,
-            "fields": "id,name,email,phone,total_price,subtotal_price,total_tax,"
-                      "shipping_lines,financial_status,fulfillment_status,fulfillments,"
-                      "line_items,shipping_address,billing_address,note,note_attributes,"
-                      "created_at,updated_at,cancelled_at,cancel_reason,customer"
-        }
-
         while True:
-            print(f"Fetching orders page {page}...")
-
-            # Respect rate limits
-            time.sleep(0.5)
+            if page == 1:
+                sync_log(f"Query params: updated_at_min={params.get('updated_at_min')}")
+            self.shopify.throttle()
 
             if page_info:
-                # Use cursor-based pagination
-                request_params = {"page_info": page_info, "limit": 250}
+                request_params = {"page_info": page_info, "limit": 250, "fields": ORDER_FIELDS}
             else:
                 request_params = params
 
-            # Retry logic for individual page fetches
-            max_retries = 3
-            response = None
-            next_token = None
-
-            for retry in range(max_retries):
-                try:
-                    response, next_token = self.shopify._make_request("orders.json", params=request_params)
-                    if response:
-                        break
-                except Exception as e:
-                    print(f"Page {page} fetch error (attempt {retry + 1}/{max_retries}): {e}")
-                    if retry < max_retries - 1:
-                        wait = min(2 ** retry, 8)
-                        print(f"Retrying in {wait}s...")
-                        time.sleep(wait)
-                    else:
-                        print(f"Failed to fetch page {page} after {max_retries} attempts, continuing with partial results")
+            response, next_token = self._fetch_page(request_params, page)
 
             if not response or "orders" not in response:
-                print(f"No more orders or error on page {page}")
-                break
+                sync_log(f"End of orders reached at page {page} (no 'orders' in response)")
+                return
 
             batch = response.get("orders", [])
             if not batch:
-                break
+                sync_log(f"Page {page}: Shopify returned empty orders array")
+                return
 
-            orders.extend(batch)
-            print(f"Page {page}: fetched {len(batch)} orders (total: {len(orders)})")
+            yield page, batch, next_token
 
-            if next_token:
-                page_info = next_token
-                page += 1
-            else:
-                break
+            if not next_token:
+                return
+            page_info = next_token
+            page += 1
 
-        return orders
+    def _fetch_page(self, request_params: Dict, page: int, attempts: int = 3) -> Tuple[Optional[Dict], Optional[str]]:
+        """
+        Fetch one page of orders, retrying when nothing usable comes back.
+
+        _make_request already retries 429s (honouring Retry-After) and 5xx
+        responses; this covers a request that still fails after those, with
+        the same jittered backoff between attempts.
 
-    def _upsert_order_with_conn(self, conn, shopify_order: Dict):
+        Returns:
+            (response JSON or None, next page cursor or None)
         """
-        Insert or update an order from Shopify data using an existing connection.
+        for retry in range(attempts):
+            try:
+                response, next_token = self.shopify._make_request("orders.json", params=request_params)
+                if response:
+                    return response, next_token
+                sync_log(f"Page {page} fetch returned nothing (attempt {retry + 1}/{attempts})")
+            except Exception as e:
+                sync_log(f"Page {page} fetch error (attempt {retry + 1}/{attempts}): {e}")
+            if retry < attempts - 1:
+                time.sleep(self.shopify.retry_wait(retry, cap=8))
+        return None, None
+
+    def _build_order_row(self, shopify_order: Dict, now: Optional[str] = None) -> Tuple:
+        """
+        Build the orders row tuple (in ORDER_COLUMNS order) for a Shopify order.
 
         Args:
-            conn: Database connection to use
             shopify_order: Order data from Shopify API
+            now: Timestamp for synced_at/created_at/updated_at; pass one per batch
+                 to avoid formatting it for every order
+
+        Returns:
+            Tuple of column values
         """
-        cursor = conn.cursor()
+        get = shopify_order.get
+
+        # Extract tracking number from the first fulfillment that has one
+        tracking_number = next(
+            (f['tracking_number'] for f in get('fulfillments') or () if f.get('tracking_number')),
+            None
+        )
+
+        # Get customer info from customer object if email/phone missing
+        customer = get('customer') or {}
+        customer_email = get('email') or customer.get('email') or ''
+        customer_phone = get('phone') or customer.get('phone') or ''
+
+        # Calculate total shipping (plain loops: these lists are usually 1-3 long)
+        total_shipping = 0.0
+        for line in get('shipping_lines') or ():
+            price = line.get('price')
+            if price:
+                total_shipping += float(price)
+
+        # Total weight from the same grams/quantity the line item rows store,
+        # so it's written with the order instead of recomputed from the table
+        total_weight_grams = 0
+        for item in get('line_items') or ():
+            quantity = item.get('quantity', 1)
+            if quantity is not None:
+                total_weight_grams += (item.get('grams', 0) or 0) * quantity
+
+        order_number = get('name', '').replace('#', '').strip()
+        if not order_number:
+            order_number = str(get('order_number', ''))
+
+        if now is None:
+            now = datetime.now(timezone.utc).isoformat()
 
-        try:
-            # Debug: log first order to verify data structure
-            order_name = shopify_order.get('name', 'Unknown')
-            if not hasattr(self, '_logged_first_order'):
-                print(f"First order being processed: {order_name} (ID: {shopify_order.get('id')})")
-                self._logged_first_order = True
-            shopify_order_id = str(shopify_order['id'])
-
-            # Check if order exists
-            cursor.execute(
-                "SELECT id FROM orders WHERE shopify_order_id = %s",
-                (shopify_order_id,)
-            )
-            existing = cursor.fetchone()
-
-            # Extract tracking number from fulfillments if available
-            tracking_number = None
-            if shopify_order.get('fulfillments'):
-                for fulfillment in shopify_order['fulfillments']:
-                    if fulfillment.get('tracking_number'):
-                        tracking_number = fulfillment['tracking_number']
-                        break
-
-            # Extract customer name from multiple sources
-            customer_name = self._get_customer_name(shopify_order)
-            customer_email = shopify_order.get('email') or ''
-            customer_phone = shopify_order.get('phone') or ''
-
-            # Get customer info from customer object if email/phone missing
-            customer = shopify_order.get('customer') or {}
-            if not customer_email and customer.get('email'):
-                customer_email = customer['email']
-            if not customer_phone and customer.get('phone'):
-                customer_phone = customer['phone']
-
-            # Calculate total shipping
-            shipping_lines = shopify_order.get('shipping_lines', [])
-            total_shipping = sum(float(s.get('price', 0)) for s in shipping_lines)
-
-            # Build order data
-            order_number = shopify_order.get('name', '').replace('#', '').strip()
-            if not order_number:
-                order_number = str(shopify_order.get('order_number', ''))
+        stored = (
+            str(shopify_order['id']),
+            order_number,
+            self._get_customer_name(shopify_order),
+            customer_email,
+            customer_phone,
+            json_dumps(get('shipping_address')),
+            get('note'),
+            float(get('total_price', 0)),
+            float(get('subtotal_price', 0)),
+            float(get('total_tax', 0)),
+            total_shipping,
+            total_weight_grams,
+            get('currency', 'CAD'),
+            get('financial_status'),
+            get('fulfillment_status'),
+            tracking_number,
+            get('created_at'),
+        )
+        cancelled_at, cancel_reason = get('cancelled_at'), get('cancel_reason')
+        content_hash = order_content_hash(
+            stored + (cancelled_at, cancel_reason),
+            [(self._build_line_item_row(None, item), item.get('properties'))
+             for item in get('line_items') or ()]
+        )
+        return stored + (get('updated_at'), cancelled_at, cancel_reason, content_hash, now, now, now)
+
+    def _drop_unchanged_orders(self, cursor, orders: List[Dict], rows: List[Tuple]) -> Tuple[List[Dict], List[Tuple]]:
+        """
+        Filter out orders (and their built rows) that are already stored as Shopify returned them.
 
-            now = datetime.now(timezone.utc).isoformat()
+        Incremental windows overlap, so most polls re-fetch orders that haven't
+        changed; skipping them avoids rewriting the order and its line items.
+        An order is unchanged if its updated_at matches, or if only updated_at
+        moved (tags, metafields, risk checks) and the synced fields hash the same.
+        """
+        cursor.execute(
+            "SELECT shopify_order_id, shopify_updated_at, content_hash FROM orders WHERE shopify_order_id = ANY(%s)",
+            ([row[0] for row in rows],)
+        )
+        # shopify_order_id -> (shopify_updated_at, content_hash)
+        known = {row[0]: row[1:] for row in cursor.fetchall()}
+        if not known:
+            return orders, rows
+
+        changed_orders, changed_rows = [], []
+        for order, row in zip(orders, rows):
+            stored = known.get(row[0])
+            if stored is None:
+                pass
+            elif stored[0] == parse_shopify_timestamp(order.get('updated_at')):
+                continue
+            elif stored[1] == row[_CONTENT_HASH_INDEX]:
+                continue
+            changed_orders.append(order)
+            changed_rows.append(row)
+        return changed_orders, changed_rows
+
+    def _upsert_orders_bulk(self, conn, orders: List[Dict], use_copy: bool = False,
+                            skip_unchanged: bool = False, now: Optional[str] = None) -> int:
+        """
+        Insert or update a page of orders with a single INSERT ... ON CONFLICT.
 
-            if existing:
-                # UPDATE existing order
-                order_id = existing['id']
-                cursor.execute("""
-                    UPDATE orders SET
-                        order_number = %s,
-                        customer_name = %s,
-                        customer_email = %s,
-                        customer_phone = %s,
-                        shipping_address = %s,
-                        billing_address = %s,
-                        note = %s,
-                        note_attributes = %s,
-                        total_price = %s,
-                        subtotal_price = %s,
-                        total_tax = %s,
-                        total_shipping = %s,
-                        currency = %s,
-                        financial_status = %s,
-                        fulfillment_status = %s,
-                        tracking_number = %s,
-                        shopify_created_at = %s,
-                        shopify_updated_at = %s,
-                        cancelled_at = %s,
-                        cancel_reason = %s,
-                        synced_at = %s,
-                        updated_at = %s
-                    WHERE id = %s
-                """, (
-                    order_number,
-                    customer_name,
-                    customer_email,
-                    customer_phone,
-                    json.dumps(shopify_order.get('shipping_address')),
-                    json.dumps(shopify_order.get('billing_address')),
-                    shopify_order.get('note'),
-                    json.dumps(shopify_order.get('note_attributes', [])),
-                    float(shopify_order.get('total_price', 0)),
-                    float(shopify_order.get('subtotal_price', 0)),
-                    float(shopify_order.get('total_tax', 0)),
-                    total_shipping,
-                    shopify_order.get('currency', 'CAD'),
-                    shopify_order.get('financial_status'),
-                    shopify_order.get('fulfillment_status'),
-                    tracking_number,
-                    shopify_order.get('created_at'),
-                    shopify_order.get('updated_at'),
-                    shopify_order.get('cancelled_at'),
-                    shopify_order.get('cancel_reason'),
-                    now,
-                    now,
-                    order_id
-                ))
+        Args:
+            conn: Database connection to use
+            orders: Orders from one Shopify page
+            use_copy: COPY rows into a staging table first (used for full syncs)
+            skip_unchanged: Skip orders whose updated_at hasn't moved (incremental syncs)
+            now: Timestamp for synced_at/updated_at (defaults to the current time)
+
+        Returns:
+            Number of orders written
+        """
+        cursor = conn.cursor(cursor_factory=PAGE_CURSOR)
+
+        try:
+            if now is None:
+                now = datetime.now(timezone.utc).isoformat()
+            rows = [self._build_order_row(order, now) for order in orders]
+
+            if skip_unchanged:
+                changed, rows = self._drop_unchanged_orders(cursor, orders, rows)
+                if len(changed) < len(orders):
+                    sync_log(f"Skipping {len(orders) - len(changed)} unchanged orders")
+                orders = changed
+                if not orders:
+                    return 0
+            if use_copy:
+                cursor.execute(CREATE_ORDERS_STAGE_SQL)
+                copy_rows(cursor, 'orders_stage', ORDER_COLUMNS, rows)
+                cursor.execute(MERGE_ORDERS_STAGE_SQL)
+                returned = cursor.fetchall()
+                cursor.execute("TRUNCATE orders_stage")
             else:
-                # INSERT new order
-                cursor.execute("""
-                    INSERT INTO orders (
-                        shopify_order_id, order_number, customer_name, customer_email,
-                        customer_phone, shipping_address, billing_address, note,
-                        note_attributes, total_price, subtotal_price, total_tax,
-                        total_shipping, currency, financial_status, fulfillment_status,
-                        tracking_number, shopify_created_at, shopify_updated_at,
-                        cancelled_at, cancel_reason, synced_at, created_at, updated_at
-                    ) VALUES (
-                        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                        %s, %s, %s, %s, %s, %s, %s, %s
-                    )
-                    RETURNING id
-                """, (
-                    shopify_order_id,
-                    order_number,
-                    customer_name,
-                    customer_email,
-                    customer_phone,
-                    json.dumps(shopify_order.get('shipping_address')),
-                    json.dumps(shopify_order.get('billing_address')),
-                    shopify_order.get('note'),
-                    json.dumps(shopify_order.get('note_attributes', [])),
-                    float(shopify_order.get('total_price', 0)),
-                    float(shopify_order.get('subtotal_price', 0)),
-                    float(shopify_order.get('total_tax', 0)),
-                    total_shipping,
-                    shopify_order.get('currency', 'CAD'),
-                    shopify_order.get('financial_status'),
-                    shopify_order.get('fulfillment_status'),
-                    tracking_number,
-                    shopify_order.get('created_at'),
-                    shopify_order.get('updated_at'),
-                    shopify_order.get('cancelled_at'),
-                    shopify_order.get('cancel_reason'),
-                    now,
-                    now,
-                    now
-                ))
-                result = cursor.fetchone()
-                order_id = result['id']
+                sql = UPSERT_CHANGED_ORDERS_SQL if skip_unchanged else UPSERT_ORDERS_SQL
+                returned = execute_values(cursor, sql, rows, page_size=250, fetch=True)
+            order_ids = {shopify_order_id: order_id for order_id, shopify_order_id in returned}
+
+            self._sync_line_items_bulk(cursor, {
+                order_ids[str(order['id'])]: order.get('line_items', [])
+                for order in orders
+                if str(order['id']) in order_ids
+            }, use_copy=use_copy)
+
+            return len(returned)
+        finally:
+            cursor.close()
+
+    def _prepare_upsert_order(self, cursor):
+        """PREPARE the single-order upsert on this connection if it isn't already."""
+        cursor.execute("SELECT 1 FROM pg_prepared_statements WHERE name = 'upsert_order'")
+        if not cursor.fetchone():
+            cursor.execute(PREPARE_UPSERT_ORDER_SQL)
+
+    def _upsert_order_with_conn(self, conn, shopify_order: Dict, now: Optional[str] = None):
+        """
+        Insert or update a single order from Shopify data using an existing connection.
+
+        Used when a page can't be written in bulk. Relies on ON CONFLICT
+        (shopify_order_id) instead of looking the order up first.
+
+        Args:
+            conn: Database connection to use
+            shopify_order: Order data from Shopify API
+            now: Timestamp for synced_at/updated_at (defaults to the current time)
+        """
+        cursor = conn.cursor(cursor_factory=PAGE_CURSOR)
+
+        try:
+            self._prepare_upsert_order(cursor)
+            cursor.execute(EXECUTE_UPSERT_ORDER_SQL, self._build_order_row(shopify_order, now))
+            order_id = cursor.fetchone()[0]
 
             # Sync line items using the same connection
             self._sync_line_items_with_conn(conn, cursor, order_id, shopify_order.get('line_items', []))
@@ -1204,7 +1565,7 @@ class OrdersSync:
 
     def _sync_line_items_with_conn(self, conn, cursor, order_id: int, line_items: List[Dict]):
         """
-        Sync line items for an order using an existing connection/cursor.
+        Sync line items for a single order using an existing connection/cursor.
 
         Args:
             conn: Database connection
@@ -1212,91 +1573,151 @@ class OrdersSync:
             order_id: Local order ID
             line_items: Line items from Shopify API
         """
-        # Delete existing line items (CASCADE will delete options too)
-        cursor.execute("DELETE FROM order_line_items WHERE order_id = %s", (order_id,))
+        self._sync_line_items_bulk(cursor, {order_id: line_items})
+
+    def _build_line_item_row(self, order_id: int, item: Dict) -> Tuple:
+        """Build the order_line_items row tuple (in LINE_ITEM_COLUMNS order) for a Shopify line item."""
+        # Calculate total discount
+        total_discount = 0.0
+        for allocation in item.get('discount_allocations') or ():
+            amount = allocation.get('amount')
+            if amount:
+                total_discount += float(amount)
+
+        return (
+            order_id,
+            str(item.get('id', '')),
+            item.get('sku'),
+            str(item.get('product_id', '')),
+            str(item.get('variant_id', '')),
+            item.get('title'),
+            item.get('variant_title'),
+            item.get('quantity', 1),
+            float(item.get('price', 0)),
+            total_discount,
+            item.get('fulfillable_quantity', 0),
+            item.get('fulfillment_status'),
+            1 if item.get('requires_shipping', True) else 0,
+            # Weight in grams (Shopify provides this per item)
+            item.get('grams', 0) or 0,
+        )
+
+    def _sync_line_items_bulk(self, cursor, items_by_order: Dict[int, List[Dict]], use_copy: bool = False):
+        """
+        Sync line items and their options for a set of orders.
 
-        for item in line_items:
-            # Calculate total discount
-            discount_allocations = item.get('discount_allocations', [])
-            total_discount = sum(float(d.get('amount', 0)) for d in discount_allocations)
+        Line items are upserted on (order_id, shopify_line_item_id); rows and
+        options that already match Shopify are not rewritten, and only rows
+        Shopify no longer returns are deleted. Runs a fixed number of
+        statements regardless of how many orders or line items are passed in.
+        Order weights are written with the order rows (see _build_order_row).
 
-            # Get weight in grams (Shopify provides this per item)
-            item_grams = item.get('grams', 0) or 0
+        Args:
+            cursor: Database cursor returning tuple rows (see PAGE_CURSOR)
+            items_by_order: Shopify line items keyed by local order ID
+            use_copy: COPY line items and options instead of execute_values
+                      (used by full syncs, same as the orders themselves)
+        """
+        order_ids = list(items_by_order)
+        if not order_ids:
+            return
+
+        if any(items_by_order.values()):
+            # Generator: rows are built as execute_values/COPY consume them
+            rows = (
+                self._build_line_item_row(order_id, item)
+                for order_id, line_items in items_by_order.items()
+                for item in line_items
+            )
+            if use_copy:
+                cursor.execute(CREATE_LINE_ITEMS_STAGE_SQL)
+                copy_rows(cursor, 'line_items_stage', LINE_ITEM_COLUMNS, rows)
+                cursor.execute(MERGE_LINE_ITEMS_STAGE_SQL)
+                cursor.execute("TRUNCATE line_items_stage")
+            else:
+                execute_values(cursor, UPSERT_LINE_ITEMS_SQL, rows, page_size=1000)
+
+        # Unchanged rows aren't RETURNed by the upsert, so read the IDs back
+        cursor.execute("""
+            SELECT id, order_id, shopify_line_item_id
+            FROM order_line_items
+            WHERE order_id = ANY(%s)
+        """, (order_ids,))
+        current_ids = {
+            (order_id, shopify_line_item_id): line_item_id
+            for line_item_id, order_id, shopify_line_item_id in cursor.fetchall()
+        }
 
+        # Desired options for every line item Shopify returned, keyed by local line item ID
+        wanted_options: Dict[int, List[Tuple[str, str]]] = {}
+        for order_id, line_items in items_by_order.items():
+            for item in line_items:
+                line_item_id = current_ids[(order_id, str(item.get('id', '')))]
+                options = wanted_options.setdefault(line_item_id, [])
+                for prop in item.get('properties', []):
+                    prop_name = prop.get('name', '')
+                    prop_value = prop.get('value', '')
+
+                    # Skip internal properties that start with underscore
+                    if prop_name and prop_value and not prop_name.startswith('_'):
+                        options.append((prop_name, str(prop_value)))
+
+        # Remove line items that are no longer on the order (CASCADE deletes their options)
+        stale_ids = [line_item_id for line_item_id in current_ids.values() if line_item_id not in wanted_options]
+        if stale_ids:
+            cursor.execute("DELETE FROM order_line_items WHERE id = ANY(%s)", (stale_ids,))
+
+        if wanted_options:
+            # Sync line item options/properties (TEPO customizations), rewriting
+            # only the line items whose options actually changed
             cursor.execute("""
-                INSERT INTO order_line_items (
-                    order_id, shopify_line_item_id, sku, product_id, variant_id,
-                    product_title, variant_title, quantity, price, total_discount,
-                    fulfillable_quantity, fulfillment_status, requires_shipping, grams
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING id
-            """, (
-                order_id,
-                str(item.get('id', '')),
-                item.get('sku'),
-                str(item.get('product_id', '')),
-                str(item.get('variant_id', '')),
-                item.get('title'),
-                item.get('variant_title'),
-                item.get('quantity', 1),
-                float(item.get('price', 0)),
-                total_discount,
-                item.get('fulfillable_quantity', 0),
-                item.get('fulfillment_status'),
-                1 if item.get('requires_shipping', True) else 0,
-                item_grams
-            ))
-            result = cursor.fetchone()
-            line_item_id = result['id']
-
-            # Sync line item options/properties (TEPO customizations)
-            properties = item.get('properties', [])
-            for prop in properties:
-                prop_name = prop.get('name', '')
-                prop_value = prop.get('value', '')
-
-                # Skip internal properties that start with underscore
-                if prop_name and prop_value and not prop_name.startswith('_'):
-                    cursor.execute("""
+                SELECT line_item_id, name, value
+                FROM order_line_item_options
+                WHERE line_item_id = ANY(%s)
+                ORDER BY id
+            """, (list(wanted_options),))
+            existing_options: Dict[int, List[Tuple[str, str]]] = {}
+            for line_item_id, name, value in cursor.fetchall():
+                existing_options.setdefault(line_item_id, []).append((name, value))
+
+            changed_ids = [
+                line_item_id for line_item_id, options in wanted_options.items()
+                if existing_options.get(line_item_id, []) != options
+            ]
+            if changed_ids:
+                cursor.execute(
+                    "DELETE FROM order_line_item_options WHERE line_item_id = ANY(%s)",
+                    (changed_ids,)
+                )
+                option_rows = [
+                    (line_item_id, name, value)
+                    for line_item_id in changed_ids
+                    for name, value in wanted_options[line_item_id]
+                ]
+                if option_rows and use_copy:
+                    copy_rows(cursor, 'order_line_item_options', ('line_item_id', 'name', 'value'), option_rows)
+                elif option_rows:
+                    execute_values(cursor, """
                         INSERT INTO order_line_item_options (line_item_id, name, value)
-                        VALUES (%s, %s, %s)
-                    """, (line_item_id, prop_name, str(prop_value)))
-
-        # Calculate and update total weight for the order
-        cursor.execute("""
-            UPDATE orders
-            SET total_weight_grams = (
-                SELECT COALESCE(SUM(grams * quantity), 0)
-                FROM order_line_items
-                WHERE order_id = %s
-            )
-            WHERE id = %s
-        """, (order_id, order_id))
+                        VALUES %s
+                    """, option_rows, page_size=1000)
 
     def _get_customer_name(self, order: Dict) -> str:
         """Extract customer name from order, trying multiple sources."""
-
-        # Try shipping address first
-        if order.get('shipping_address'):
-            addr = order['shipping_address']
-            name = addr.get('name') or f"{addr.get('first_name', '')} {addr.get('last_name', '')}".strip()
-            if name:
-                return name
-
-        # Try billing address
-        if order.get('billing_address'):
-            addr = order['billing_address']
-            name = addr.get('name') or f"{addr.get('first_name', '')} {addr.get('last_name', '')}".strip()
+        # Shipping address, then billing address, then customer object;
+        # stop at the first source that yields a name
+        for key in ('shipping_address', 'billing_address', 'customer'):
+            source = order.get(key)
+            if not source:
+                continue
+            name = source.get('name') if key != 'customer' else None
             if name:
                 return name
-
-        # Try customer object
-        if order.get('customer'):
-            cust = order['customer']
-            name = f"{cust.get('first_name', '')} {cust.get('last_name', '')}".strip()
-            if name:
-                return name
-
+            first, last = source.get('first_name'), source.get('last_name')
+            if first and last:
+                return f"{first} {last}"
+            if first or last:
+                return (first or last).strip()
         return "Unknown Customer"
 
     def get_sync_status(self) -> Dict:
@@ -1323,7 +1744,7 @@ class OrdersSync:
                         if updated_at.tzinfo is None:
                             updated_at = updated_at.replace(tzinfo=timezone.utc)
                         age_minutes = (datetime.now(timezone.utc) - updated_at).total_seconds() / 60
-                        if age_minutes > 2:
+                        if age_minutes > self.STALE_SYNC_MINUTES:
                             result['can_resume'] = True
                             result['status_hint'] = 'interrupted'
                 return result
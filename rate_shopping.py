@@ -4,7 +4,13 @@ Unified Rate Shopping Service
 Compares shipping rates across UPS and Canada Post carriers.
 """
 
-from typing import Dict, List, Any, Optional
+import copy
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
 from ups_api import get_ups_shipping_api, UPSShippingAPI
 from canadapost_api import get_canadapost_shipping_api, CanadaPostShippingAPI
 
@@ -15,6 +21,10 @@ class RateShoppingService:
     Compares UPS and Canada Post rates for a shipment.
     """
 
+    # Successful quotes are reused for identical requests (e.g. UI reloads) for this long
+    RATE_CACHE_TTL = 60
+    RATE_CACHE_MAX = 1024
+
     def __init__(self, db_connection_func):
         """
         Initialize rate shopping service.
@@ -26,6 +36,10 @@ class RateShoppingService:
         self.ups = get_ups_shipping_api()
         self.canada_post = get_canadapost_shipping_api()
 
+        # request key -> (result, time.monotonic() when cached)
+        self._rate_cache: Dict[str, Tuple[Dict[str, Any], float]] = {}
+        self._rate_cache_lock = threading.Lock()
+
     def get_customs_data_for_order(self, order_id: int) -> List[Dict]:
         """
         Get customs declaration data for an order's line items.
@@ -33,6 +47,22 @@ class RateShoppingService:
 
         Returns list of customs items ready for carrier APIs.
         """
+        return self.get_customs_data_for_orders([order_id]).get(order_id, [])
+
+    def get_customs_data_for_orders(self, order_ids: List[int]) -> Dict[int, List[Dict]]:
+        """
+        Get customs declaration data for several orders in one query.
+
+        Args:
+            order_ids: Local order IDs
+
+        Returns:
+            Customs items (as from get_customs_data_for_order) keyed by order ID;
+            orders without line items are absent
+        """
+        if not order_ids:
+            return {}
+
         conn = self.get_db_connection()
         try:
             cursor = conn.cursor()
@@ -40,6 +70,7 @@ class RateShoppingService:
             # Get line items with customs info - prefer product_customs_info if available
             cursor.execute("""
                 SELECT
+                    oli.order_id,
                     oli.sku,
                     oli.product_title,
                     oli.quantity,
@@ -51,12 +82,13 @@ class RateShoppingService:
                     COALESCE(pci.weight_grams, oli.grams, 200) as weight_grams
                 FROM order_line_items oli
                 LEFT JOIN product_customs_info pci ON pci.sku = oli.sku
-                WHERE oli.order_id = %s
-            """, (order_id,))
+                WHERE oli.order_id = ANY(%s)
+                ORDER BY oli.order_id, oli.id
+            """, (list(order_ids),))
 
-            items = []
+            items_by_order: Dict[int, List[Dict]] = {}
             for row in cursor.fetchall():
-                items.append({
+                items_by_order.setdefault(row["order_id"], []).append({
                     "sku": row.get("sku") or "",
                     "description": (row.get("customs_description") or "Goods")[:35],  # Carrier limits
                     "hs_code": row.get("hs_code") or "4820102010",
@@ -67,7 +99,7 @@ class RateShoppingService:
                 })
 
             cursor.close()
-            return items
+            return items_by_order
 
         finally:
             conn.close()
@@ -76,7 +108,8 @@ class RateShoppingService:
         self,
         destination: Dict[str, str],
         packages: List[Dict],
-        customs_items: List[Dict] = None
+        customs_items: List[Dict] = None,
+        sort_rates: bool = True
     ) -> Dict[str, Any]:
         """
         Get rates from all carriers and combine results.
@@ -97,6 +130,8 @@ class RateShoppingService:
                 "height_cm": 5
             }]
             customs_items: list of items (for international)
+            sort_rates: Sort "rates" by price; callers that only need
+                cheapest/fastest can pass False
 
         Returns:
             {
@@ -124,69 +159,66 @@ class RateShoppingService:
                 "fastest": {...}
             }
         """
+        # Packages that weigh nothing can't be quoted; don't spend carrier calls on them
+        if packages and sum(pkg.get("weight_kg", 0.5) for pkg in packages) <= 0:
+            return {
+                "success": False,
+                "rates": [],
+                "cheapest": None,
+                "fastest": None,
+                "errors": ["Package weight must be greater than zero"]
+            }
+
+        cache_key = hashlib.blake2b(
+            json.dumps([destination, packages, customs_items, sort_rates], sort_keys=True, default=str).encode(),
+            digest_size=16
+        ).hexdigest()
+        with self._rate_cache_lock:
+            cached = self._rate_cache.get(cache_key)
+        if cached and time.monotonic() - cached[1] < self.RATE_CACHE_TTL:
+            return copy.deepcopy(cached[0])
+
         all_rates = []
         errors = []
 
-        # Calculate total weight for Canada Post (they want single weight)
-        total_weight_kg = sum(pkg.get("weight_kg", 0.5) for pkg in packages)
-
-        # Get Canada Post rates
+        # Query enabled carriers in parallel; total latency is the slowest carrier, not the sum
+        carrier_calls = []
         if self.canada_post.rating_enabled:
-            try:
-                cp_result = self.canada_post.get_rates(
-                    destination_postal=destination.get("postal_code", ""),
-                    destination_country=destination.get("country_code", "CA"),
-                    weight_kg=total_weight_kg,
-                    dimensions_cm={
-                        "length": packages[0].get("length_cm", 25) if packages else 25,
-                        "width": packages[0].get("width_cm", 18) if packages else 18,
-                        "height": packages[0].get("height_cm", 5) if packages else 5
-                    },
-                    customs_items=customs_items
-                )
-
-                if cp_result.get("success"):
-                    for rate in cp_result.get("rates", []):
-                        rate["carrier"] = "Canada Post"
-                        all_rates.append(rate)
-                else:
-                    errors.append(f"Canada Post: {cp_result.get('error')}")
-
-            except Exception as e:
-                errors.append(f"Canada Post: {str(e)}")
-
-        # Get UPS rates
+            carrier_calls.append(lambda: self._get_canada_post_rates(destination, packages, customs_items))
         if self.ups.rating_enabled:
-            try:
-                ups_result = self.ups.get_rates(
-                    destination=destination,
-                    packages=packages,
-                    customs_items=customs_items
-                )
+            carrier_calls.append(lambda: self._get_ups_rates(destination, packages, customs_items))
 
-                if ups_result.get("success"):
-                    for rate in ups_result.get("rates", []):
-                        rate["carrier"] = "UPS"
-                        all_rates.append(rate)
-                else:
-                    errors.append(f"UPS: {ups_result.get('error')}")
+        if len(carrier_calls) > 1:
+            with ThreadPoolExecutor(max_workers=len(carrier_calls)) as executor:
+                futures = [executor.submit(call) for call in carrier_calls]
+                results = [future.result() for future in futures]
+        else:
+            results = [call() for call in carrier_calls]
 
-            except Exception as e:
-                errors.append(f"UPS: {str(e)}")
-
-        # Sort all rates by price
-        all_rates.sort(key=lambda x: x["total_charge"])
-
-        # Find cheapest and fastest
-        cheapest = all_rates[0] if all_rates else None
+        # Merge in carrier order (Canada Post, then UPS) so ties sort the same as before
+        for rates, error in results:
+            all_rates.extend(rates)
+            if error:
+                errors.append(error)
 
+        # Find cheapest and fastest in one pass (ties go to the earlier rate,
+        # and the fastest tie to the cheaper one, as when scanning the sorted list)
+        cheapest = None
         fastest = None
         for rate in all_rates:
-            if rate.get("delivery_days"):
-                if fastest is None or rate["delivery_days"] < fastest.get("delivery_days", 999):
+            charge = rate["total_charge"]
+            if cheapest is None or charge < cheapest["total_charge"]:
+                cheapest = rate
+            days = rate.get("delivery_days")
+            if days:
+                if (fastest is None or days < fastest["delivery_days"]
+                        or (days == fastest["delivery_days"] and charge < fastest["total_charge"])):
                     fastest = rate
 
-        return {
+        if sort_rates:
+            all_rates.sort(key=lambda x: x["total_charge"])
+
+        result = {
             "success": len(all_rates) > 0,
             "rates": all_rates,
             "cheapest": cheapest,
@@ -194,6 +226,75 @@ class RateShoppingService:
             "errors": errors if errors else None
         }
 
+        # Only cache complete answers, so a carrier outage isn't remembered
+        if all_rates and not errors:
+            with self._rate_cache_lock:
+                if len(self._rate_cache) >= self.RATE_CACHE_MAX:
+                    # Drop the oldest entry (dicts keep insertion order)
+                    self._rate_cache.pop(next(iter(self._rate_cache)))
+                self._rate_cache[cache_key] = (copy.deepcopy(result), time.monotonic())
+
+        return result
+
+    def _get_canada_post_rates(
+        self,
+        destination: Dict[str, str],
+        packages: List[Dict],
+        customs_items: List[Dict] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Get Canada Post rates as (rates, error message or None)."""
+        # Calculate total weight for Canada Post (they want single weight)
+        total_weight_kg = sum(pkg.get("weight_kg", 0.5) for pkg in packages)
+
+        try:
+            cp_result = self.canada_post.get_rates(
+                destination_postal=destination.get("postal_code", ""),
+                destination_country=destination.get("country_code", "CA"),
+                weight_kg=total_weight_kg,
+                dimensions_cm={
+                    "length": packages[0].get("length_cm", 25) if packages else 25,
+                    "width": packages[0].get("width_cm", 18) if packages else 18,
+                    "height": packages[0].get("height_cm", 5) if packages else 5
+                },
+                customs_items=customs_items
+            )
+
+            if not cp_result.get("success"):
+                return [], f"Canada Post: {cp_result.get('error')}"
+
+            rates = cp_result.get("rates", [])
+            for rate in rates:
+                rate["carrier"] = "Canada Post"
+            return rates, None
+
+        except Exception as e:
+            return [], f"Canada Post: {str(e)}"
+
+    def _get_ups_rates(
+        self,
+        destination: Dict[str, str],
+        packages: List[Dict],
+        customs_items: List[Dict] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Get UPS rates as (rates, error message or None)."""
+        try:
+            ups_result = self.ups.get_rates(
+                destination=destination,
+                packages=packages,
+                customs_items=customs_items
+            )
+
+            if not ups_result.get("success"):
+                return [], f"UPS: {ups_result.get('error')}"
+
+            rates = ups_result.get("rates", [])
+            for rate in rates:
+                rate["carrier"] = "UPS"
+            return rates, None
+
+        except Exception as e:
+            return [], f"UPS: {str(e)}"
+
 
 # Singleton instance
 _rate_shopping_service = None
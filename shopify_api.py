@@ -2,9 +2,127 @@
 import os
 import requests
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, Generator
+from typing import Optional, Dict, Any, Generator, Iterator, List, Tuple
 import time
-import re
+from collections import OrderedDict
+import queue
+import random
+import threading
+from concurrent.futures import Future
+
+# orjson decodes order pages several times faster than requests' stdlib json
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# Orders whose fulfillments carry a given tracking number, with just the
+# fields get_order_by_tracking returns. Shopify rejects queries whose requested
+# cost is over 1000 points (connection = 2 + first x node cost), so the page
+# sizes are kept small: 2 + 2 x (order 1 + customer 1 + 5 fulfillments x 2 +
+# line items 2 + 50 x 3) = about 330. Like the REST scan, only the first
+# tracking number of each fulfillment is matched.
+TRACKING_LINE_ITEMS_PAGE = 50
+TRACKING_ORDER_QUERY = """
+query ordersByTracking($query: String!) {
+  orders(first: 2, query: $query, sortKey: CREATED_AT, reverse: true) {
+    edges {
+      node {
+        id
+        legacyResourceId
+        name
+        customer { firstName lastName email }
+        fulfillments(first: 5) { trackingInfo(first: 1) { number } }
+        lineItems(first: %d) {
+          pageInfo { hasNextPage endCursor }
+          nodes {
+            name
+            quantity
+            sku
+            originalUnitPriceSet { shopMoney { amount } }
+          }
+        }
+      }
+    }
+  }
+}
+""" % TRACKING_LINE_ITEMS_PAGE
+
+# Remaining line items of a large order (cost about 1 + 2 + 100 x 3 = 303)
+ORDER_LINE_ITEMS_QUERY = """
+query orderLineItems($id: ID!, $after: String) {
+  order(id: $id) {
+    lineItems(first: 100, after: $after) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        name
+        quantity
+        sku
+        originalUnitPriceSet { shopMoney { amount } }
+      }
+    }
+  }
+}
+"""
+
+
+# Most tracking lookups kept in ShopifyAPI's order cache
+ORDER_CACHE_MAX = int(os.environ.get("ORDER_CACHE_MAX", "10000"))
+
+# Seconds a found order is cached (order data barely changes once shipped), and
+# how long a "No Order Found" result is cached so repeat scans of an unknown
+# label don't re-scan a year of orders each time
+ORDER_CACHE_TTL = 24 * 60 * 60
+ORDER_MISS_TTL = 5 * 60
+
+
+def prefetch(iterable, maxsize: int = 2) -> Iterator:
+    """
+    Iterate `iterable` on a background thread, buffering up to `maxsize` items
+    ahead of the consumer. Exceptions raised by the producer are re-raised in
+    the consumer; if the consumer stops early the producer stops before pulling
+    another item (so a page generator won't start another request).
+    """
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        iterator = iter(iterable)
+        try:
+            while not stop.is_set():
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    put((done, None))
+                    return
+                if not put((item, None)):
+                    return
+        except Exception as e:
+            put((done, e))
+
+    thread = threading.Thread(target=produce, name='prefetch', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is done:
+                if error:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
 
 class ShopifyAPI:
     def __init__(self):
@@ -32,57 +150,109 @@ class ShopifyAPI:
         self.session = requests.Session()
         self.session.headers.update({
             "X-Shopify-Access-Token": access_token,
-            "Content-Type": "application/json"
+            "Content-Type": "application/json",
+            # 250-order pages compress well; requests sends this by default, but be explicit
+            "Accept-Encoding": "gzip, deflate"
         })
         
-        # Initialize cache for order lookups
-        self._order_cache: Dict[str, Dict[str, Any]] = {}
+        # LRU cache of tracking lookups, bounded so long-running workers don't grow forever;
+        # values are (time.monotonic() expiry, result)
+        self._order_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._order_cache_lock = threading.Lock()
+
+        # Lookups currently running, so concurrent scans of one label share a single traversal
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+
+        # (used, limit) from the last X-Shopify-Shop-Api-Call-Limit header
+        self.last_call_limit: Optional[Tuple[int, int]] = None
 
     # … rest of your methods follow exactly as before …
     def _extract_next_page_token(self, headers) -> Optional[str]:
         link_header = headers.get("Link", "")
         if not link_header:
             return None
-        matches = re.findall(r'<([^>]+)>;\s*rel="next"', link_header)
-        if not matches:
+        # Header looks like: <https://...page_info=abc>; rel="previous", <https://...page_info=def>; rel="next"
+        rel = link_header.find('rel="next"')
+        if rel == -1:
             return None
-        next_url = matches[0]
-        m = re.search(r"page_info=([^&]+)", next_url)
-        return m.group(1) if m else None
+        end = link_header.rfind(">", 0, rel)
+        start = link_header.rfind("<", 0, end)
+        if start == -1 or end == -1:
+            return None
+        next_url = link_header[start + 1:end]
+        return next_url.partition("page_info=")[2].partition("&")[0] or None
+
+    def _record_call_limit(self, headers):
+        """Remember the leaky-bucket fill level Shopify reported, e.g. "32/40"."""
+        used, _, limit = headers.get("X-Shopify-Shop-Api-Call-Limit", "").partition("/")
+        try:
+            self.last_call_limit = (int(used), int(limit))
+        except ValueError:
+            pass
+
+    def call_limit_usage(self) -> float:
+        """Fraction of the REST call bucket used as of the last response (0.0 if unknown)."""
+        if not self.last_call_limit or not self.last_call_limit[1]:
+            return 0.0
+        used, limit = self.last_call_limit
+        return used / limit
+
+    def throttle(self):
+        """
+        Sleep before the next request in proportion to how full the call bucket was
+        on the last response: not at all under half, briefly up to 80%, then longer.
+        """
+        usage = self.call_limit_usage()
+        if usage < 0.5:
+            return
+        time.sleep(0.1 if usage < 0.8 else 0.5 * usage)
+
+    @staticmethod
+    def retry_wait(retry: int, retry_after: Optional[str] = None, cap: float = 16) -> float:
+        """
+        Seconds to wait before retry number `retry` (0-based).
+
+        Uses Shopify's Retry-After header when given, otherwise exponential
+        backoff capped at `cap`, plus up to 25% jitter so parallel workers
+        don't all retry at the same instant.
+        """
+        try:
+            wait = float(retry_after) if retry_after else min(2 ** retry, cap)
+        except ValueError:
+            wait = min(2 ** retry, cap)
+        return wait + random.uniform(0, 0.25 * wait)
 
     def _make_request(self, endpoint: str, method: str = "GET", params: dict = None) -> tuple[Optional[Dict], Optional[str]]:
         url = f"https://{self.shop_url}/admin/api/{self.api_version}/{endpoint}"
         max_retries = 5  # Increased from 3 to 5
         retry = 0
 
-        # Debug log for orders.json requests
-        if endpoint == "orders.json" and params:
-            print(f"[Shopify API] GET {endpoint} with params: {params}")
-
         while retry < max_retries:
             try:
                 resp = self.session.request(method, url, params=params, timeout=30)
+                self._record_call_limit(resp.headers)
 
                 # Handle rate limiting (429)
                 if resp.status_code == 429:
-                    wait = int(resp.headers.get("Retry-After", 2))
-                    print(f"Shopify rate limit hit, waiting {wait}s before retry {retry + 1}/{max_retries}")
+                    wait = self.retry_wait(1, resp.headers.get("Retry-After"))
+                    print(f"Shopify rate limit hit, waiting {wait:.1f}s before retry {retry + 1}/{max_retries}")
                     time.sleep(wait)
                     retry += 1
                     continue
 
                 # Handle 503 Service Unavailable with exponential backoff
                 if resp.status_code == 503:
-                    wait = min(2 ** retry, 16)  # Exponential backoff: 1s, 2s, 4s, 8s, 16s max
-                    print(f"Shopify 503 error, waiting {wait}s before retry {retry + 1}/{max_retries}")
+                    wait = self.retry_wait(retry, resp.headers.get("Retry-After"))  # else 1s, 2s, 4s, 8s, 16s max
+                    print(f"Shopify 503 error, waiting {wait:.1f}s before retry {retry + 1}/{max_retries}")
                     time.sleep(wait)
                     retry += 1
                     continue
 
                 # Handle other 5xx errors with exponential backoff
                 if 500 <= resp.status_code < 600:
-                    wait = min(2 ** retry, 16)
-                    print(f"Shopify {resp.status_code} error, waiting {wait}s before retry {retry + 1}/{max_retries}")
+                    wait = self.retry_wait(retry)
+                    print(f"Shopify {resp.status_code} error, waiting {wait:.1f}s before retry {retry + 1}/{max_retries}")
                     time.sleep(wait)
                     retry += 1
                     continue
@@ -97,7 +267,7 @@ class ShopifyAPI:
                     return None, None
 
                 try:
-                    json_data = resp.json()
+                    json_data = json_loads(resp.content)
                     next_token = self._extract_next_page_token(resp.headers)
                     return json_data, next_token
                 except ValueError as e:
@@ -105,9 +275,14 @@ class ShopifyAPI:
                     print(f"Response preview: {resp.text[:200]}")
                     return None, None
 
+            except requests.exceptions.HTTPError as e:
+                # Other 4xx (bad params, auth, not found) won't succeed on retry
+                print(f"Shopify request failed: {e}")
+                return None, None
+
             except requests.exceptions.Timeout as e:
-                wait = min(2 ** retry, 8)
-                print(f"Shopify timeout error: {e}, waiting {wait}s before retry {retry + 1}/{max_retries}")
+                wait = self.retry_wait(retry, cap=8)
+                print(f"Shopify timeout error: {e}, waiting {wait:.1f}s before retry {retry + 1}/{max_retries}")
                 if retry < max_retries - 1:
                     time.sleep(wait)
                     retry += 1
@@ -115,8 +290,8 @@ class ShopifyAPI:
                 return None, None
 
             except requests.exceptions.RequestException as e:
-                wait = min(2 ** retry, 8)
-                print(f"Shopify request error: {e}, waiting {wait}s before retry {retry + 1}/{max_retries}")
+                wait = self.retry_wait(retry, cap=8)
+                print(f"Shopify request error: {e}, waiting {wait:.1f}s before retry {retry + 1}/{max_retries}")
                 if retry < max_retries - 1:
                     time.sleep(wait)
                     retry += 1
@@ -126,29 +301,152 @@ class ShopifyAPI:
         print(f"Shopify API request failed after {max_retries} retries")
         return None, None
 
-    def _get_paginated_orders(self, initial_params: dict) -> Generator[dict, None, None]:
-        page = 1
+    def _graphql(self, query: str, variables: Optional[dict] = None) -> Optional[Dict]:
+        """
+        Run an Admin GraphQL query and return its "data", or None on any error
+        (HTTP failure, throttling, or GraphQL errors) so callers can fall back to REST.
+        """
+        url = f"https://{self.shop_url}/admin/api/{self.api_version}/graphql.json"
+        try:
+            resp = self.session.post(url, json={"query": query, "variables": variables or {}}, timeout=30)
+            if resp.status_code != 200:
+                print(f"Shopify GraphQL returned HTTP {resp.status_code}")
+                return None
+            payload = json_loads(resp.content)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Shopify GraphQL request failed: {e}")
+            return None
+
+        if payload.get("errors"):
+            # extensions.cost shows requestedQueryCost, e.g. for MAX_COST_EXCEEDED
+            cost = (payload.get("extensions") or {}).get("cost")
+            print(f"Shopify GraphQL errors: {payload['errors']} (cost: {cost})")
+            return None
+        return payload.get("data")
+
+    def _find_order_by_tracking_graphql(self, tracking_number: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up an order by tracking number with one GraphQL search instead of
+        paging through a year of orders over REST.
+
+        Search results are re-checked against the fulfillments' tracking numbers
+        (same exact / case-and-space-insensitive match as the REST scan), so an
+        unsupported or loose search never returns the wrong order.
+
+        Returns:
+            Order data in get_order_by_tracking's format, or None if not found
+            (or if GraphQL is unavailable)
+        """
+        search_term = tracking_number.replace('"', '').replace('\\', '')
+        data = self._graphql(TRACKING_ORDER_QUERY, {"query": f'fulfillment_tracking_number:"{search_term}"'})
+        if not data:
+            return None
+
+        wanted = tracking_number.replace(" ", "").upper()
+        for edge in (data.get("orders") or {}).get("edges", []):
+            order = edge.get("node") or {}
+            numbers = [
+                info.get("number") or ""
+                for fulfillment in order.get("fulfillments") or []
+                for info in fulfillment.get("trackingInfo") or []
+            ]
+            if not any(n == tracking_number or n.replace(" ", "").upper() == wanted for n in numbers):
+                continue
+
+            cust = order.get("customer") or {}
+            name = order.get("name") or ""
+            line_items = self._graphql_line_items(order)
+            if line_items is None:
+                return None
+            formatted_items = []
+            for item in line_items:
+                amount = ((item.get("originalUnitPriceSet") or {}).get("shopMoney") or {}).get("amount") or "0"
+                formatted_items.append({
+                    "name": item.get("name", ""),
+                    "quantity": item.get("quantity", 1),
+                    "price": f"{float(amount):.2f}",
+                    "sku": item.get("sku") or ""
+                })
+
+            print(f"✅ Shopify: Found match via GraphQL in order {name}")
+            return {
+                # REST's order_number is the numeric part of the order name ("#1234" -> "1234")
+                "order_number": "".join(ch for ch in name if ch.isdigit()) or name.lstrip("#") or "N/A",
+                "customer_name": (
+                    f"{cust.get('firstName') or ''} {cust.get('lastName') or ''}".strip()
+                    or "N/A"
+                ),
+                "customer_email": cust.get("email") or "",
+                "order_id": str(order.get("legacyResourceId", "")),
+                "line_items": formatted_items
+            }
+        print(f"Shopify GraphQL: no order with tracking '{tracking_number}'")
+        return None
+
+    def _graphql_line_items(self, order: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """
+        All line item nodes of a GraphQL order, fetching pages past the first
+        TRACKING_LINE_ITEMS_PAGE as needed. Returns None if a page fails to load.
+        """
+        connection = order.get("lineItems") or {}
+        items = list(connection.get("nodes") or [])
+        page_info = connection.get("pageInfo") or {}
+        while page_info.get("hasNextPage"):
+            data = self._graphql(ORDER_LINE_ITEMS_QUERY, {"id": order.get("id"), "after": page_info.get("endCursor")})
+            connection = ((data or {}).get("order") or {}).get("lineItems")
+            if not connection:
+                return None
+            items.extend(connection.get("nodes") or [])
+            page_info = connection.get("pageInfo") or {}
+        return items
+
+    def _iter_order_pages(self, initial_params: dict) -> Generator[List[dict], None, None]:
+        """Yield each non-empty page of orders, following cursor pagination."""
         params = initial_params.copy()
-        
         while True:
             response, next_token = self._make_request("orders.json", params=params)
-            if not response or "orders" not in response:
-                break
-            orders = response["orders"]
-            if not orders:
-                break
-            for order in orders:
-                yield order
-            if next_token:
-                params = {"page_info": next_token, "limit": initial_params.get("limit", 250)}
-                page += 1
-            else:
-                break
+            if not response or "orders" not in response or not response["orders"]:
+                return
+            yield response["orders"]
+            if not next_token:
+                return
+            self.throttle()
+            params = {"page_info": next_token, "limit": initial_params.get("limit", 250)}
+
+    def _get_paginated_orders(self, initial_params: dict) -> Generator[dict, None, None]:
+        """
+        Yield orders across all pages, fetching the next page on a background
+        thread while the caller works through the current one. At most one page
+        is buffered ahead; if the caller stops early (e.g. a tracking match),
+        the fetcher stops after its current request.
+        """
+        for orders in prefetch(self._iter_order_pages(initial_params), maxsize=1):
+            yield from orders
 
     def get_order_by_tracking(self, tracking_number: str) -> Dict[str, Any]:
-        if tracking_number in self._order_cache:
-            return self._order_cache[tracking_number]
+        with self._inflight_lock:
+            cached = self._cache_get(tracking_number)
+            if cached is not None:
+                return cached
+            pending = self._inflight.get(tracking_number)
+            if pending is None:
+                future = self._inflight[tracking_number] = Future()
+        if pending is not None:
+            # Someone is already scanning for this label; wait for their result
+            return pending.result()
 
+        try:
+            result = self._lookup_order_by_tracking(tracking_number)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[tracking_number]
+
+    def _lookup_order_by_tracking(self, tracking_number: str) -> Dict[str, Any]:
         try:
             # Expanded search: look for any order with fulfillments in last 365 days
             params = {
@@ -160,6 +458,13 @@ class ShopifyAPI:
             created_at_min = (datetime.now() - timedelta(days=365)).isoformat()  # Increased to 365 days
             params["created_at_min"] = created_at_min
 
+            # Fast path: one GraphQL search; the REST scan below stays as the fallback
+            order_data = self._find_order_by_tracking_graphql(tracking_number)
+            if order_data:
+                self._cache_put(tracking_number, order_data)
+                return order_data
+            print(f"↩️ Shopify: GraphQL lookup didn't find '{tracking_number}', falling back to REST scan")
+
             print(f"🔍 Shopify: Searching for tracking '{tracking_number}' in orders from last 365 days...")
 
             orders_checked = 0
@@ -195,7 +500,7 @@ class ShopifyAPI:
                             "order_id": str(order.get("id", "")),
                             "line_items": formatted_items
                         }
-                        self._order_cache[tracking_number] = order_data
+                        self._cache_put(tracking_number, order_data)
                         return order_data
 
                     # Try case-insensitive match with spaces removed
@@ -224,7 +529,7 @@ class ShopifyAPI:
                             "order_id": str(order.get("id", "")),
                             "line_items": formatted_items
                         }
-                        self._order_cache[tracking_number] = order_data
+                        self._cache_put(tracking_number, order_data)
                         return order_data
 
             print(f"❌ Shopify: No match found by tracking after checking {orders_checked} orders")
@@ -236,17 +541,20 @@ class ShopifyAPI:
                 order_search_result = self._search_by_order_number(tracking_number)
                 if order_search_result and order_search_result.get("order_id"):
                     print(f"✅ Shopify: Found order by order number search!")
-                    self._order_cache[tracking_number] = order_search_result
+                    self._cache_put(tracking_number, order_search_result)
                     return order_search_result
 
             print(f"❌ Shopify: No match found by any method")
-            return {
+            not_found = {
                 "order_number": "N/A",
                 "customer_name": "No Order Found",
                 "customer_email": "",
                 "order_id": None,
                 "line_items": []
             }
+            # Errors (below) aren't cached; a definite miss is, briefly
+            self._cache_put(tracking_number, not_found, ttl=ORDER_MISS_TTL)
+            return not_found
         except Exception as e:
             return {
                 "order_number": "N/A",
@@ -316,8 +624,30 @@ class ShopifyAPI:
             print(f"Error searching by order number: {e}")
             return None
 
+    def _cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return an unexpired cached lookup and mark it most recently used."""
+        with self._order_cache_lock:
+            entry = self._order_cache.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._order_cache[key]
+                return None
+            self._order_cache.move_to_end(key)
+            return value
+
+    def _cache_put(self, key: str, value: Dict[str, Any], ttl: float = ORDER_CACHE_TTL):
+        """Cache a lookup for `ttl` seconds, evicting the least recently used entry past ORDER_CACHE_MAX."""
+        with self._order_cache_lock:
+            self._order_cache[key] = (time.monotonic() + ttl, value)
+            self._order_cache.move_to_end(key)
+            while len(self._order_cache) > ORDER_CACHE_MAX:
+                self._order_cache.popitem(last=False)
+
     def clear_cache(self):
-        self._order_cache.clear()
+        with self._order_cache_lock:
+            self._order_cache.clear()
 
     def get_order(self, order_id: str) -> Optional[Dict[str, Any]]:
         """
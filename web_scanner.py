@@ -57,6 +57,7 @@ import psycopg2
 import psycopg2.extras
 from datetime import datetime, timedelta, timezone
 import threading
+import weakref
 import csv
 import io
 
@@ -439,21 +440,170 @@ def friendly_date_filter(value):
 # ── PostgreSQL connection settings (Neon) ──
 DATABASE_URL = os.environ.get("DATABASE_URL", "")
 
+# Connections are pooled so a request doesn't pay a fresh TLS handshake to Neon.
+# close() on a pooled connection hands it back instead of disconnecting, so
+# callers keep using get_db_connection() / conn.close() as before.
+DB_POOL_MIN = int(os.environ.get("DB_POOL_MIN", "2"))    # kept open while idle
+DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", "10"))   # beyond this, connect directly
+DB_POOL_PING_AFTER = 60  # seconds idle before a pooled connection is checked with SELECT 1
+
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+
+class PooledConnection:
+    """
+    One checkout of a pooled psycopg2 connection.
+
+    Behaves like the connection itself, but close() hands it back to the pool
+    instead of disconnecting. Only the first close() counts: afterwards this
+    handle is detached, so a second close() (or any other use) can't touch the
+    connection once another request has checked it out.
+    """
+
+    def __init__(self, pool, conn):
+        object.__setattr__(self, "_pool", pool)
+        object.__setattr__(self, "_conn", conn)
+        # Callers that never close() (an exception before conn.close()) drop the
+        # handle; the connection is then garbage-collected and its slot freed
+        object.__setattr__(self, "_finalizer", weakref.finalize(self, pool.release_slot))
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise psycopg2.InterfaceError("connection already closed")
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        if self._conn is None:
+            raise psycopg2.InterfaceError("connection already closed")
+        setattr(self._conn, name, value)
+
+    @property
+    def closed(self) -> int:
+        return 1 if self._conn is None else self._conn.closed
+
+    def close(self):
+        conn = self._conn
+        if conn is None:
+            return
+        object.__setattr__(self, "_conn", None)
+        self._finalizer.detach()
+        self._pool.putconn(conn)
+
+
+class ConnectionPool:
+    """
+    Up to `minconn` idle connections kept for reuse, and at most `maxconn` checked out.
+
+    Each checkout is a PooledConnection handle, and the pool keeps no reference
+    to it, so a handle that is never closed is garbage-collected (disconnecting
+    its connection, as an unpooled one would be) and gives its slot back.
+    """
+
+    def __init__(self, minconn: int, maxconn: int, dsn: str, **kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self._dsn = dsn
+        self._kwargs = kwargs
+        self._idle = []  # (connection, time.monotonic() when returned)
+        self._checked_out = 0
+        # Re-entrant: a finalizer can run on any thread, even one already holding the lock
+        self._lock = threading.RLock()
+
+    def getconn(self):
+        """Check out a live idle or new connection, or return None if maxconn are already out."""
+        while True:
+            with self._lock:
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                elif self._checked_out >= self.maxconn:
+                    return None
+                else:
+                    conn = None
+                self._checked_out += 1
+
+            if conn is None:
+                try:
+                    conn = psycopg2.connect(self._dsn, **self._kwargs)
+                except BaseException:
+                    self.release_slot()
+                    raise
+            elif not self._is_alive(conn, returned_at):
+                self.release_slot()
+                conn.close()
+                continue
+            return PooledConnection(self, conn)
+
+    @staticmethod
+    def _is_alive(conn, returned_at: float) -> bool:
+        """Neon drops connections that sit idle; check long-idle ones before use."""
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < DB_POOL_PING_AFTER:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def putconn(self, conn):
+        """Take back the connection of a closed PooledConnection."""
+        try:
+            # Don't hand an open transaction or manual-commit mode to the next caller
+            if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            conn.autocommit = True
+            keep = not conn.closed
+        except psycopg2.Error:
+            keep = False
+
+        with self._lock:
+            self._checked_out -= 1
+            if keep and len(self._idle) < self.minconn:
+                self._idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def release_slot(self):
+        """Free the slot of a checkout whose connection is gone."""
+        with self._lock:
+            self._checked_out -= 1
+
+
+def _get_db_pool():
+    """Create the connection pool on first use."""
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                _db_pool = ConnectionPool(
+                    DB_POOL_MIN, DB_POOL_MAX, DATABASE_URL,
+                    cursor_factory=psycopg2.extras.RealDictCursor,
+                    connect_timeout=10
+                )
+    return _db_pool
+
+
 def get_db_connection():
     """
-    Create a fresh PostgreSQL connection with retry logic.
-    Uses psycopg2 for Neon PostgreSQL.
+    Get a PostgreSQL connection from the pool, with retry logic.
+    Uses psycopg2 for Neon PostgreSQL. Falls back to a fresh connection
+    when every pooled connection is in use.
     """
     max_retries = 3
     last_error = None
 
     for retry in range(max_retries):
         try:
-            conn = psycopg2.connect(
-                DATABASE_URL,
-                cursor_factory=psycopg2.extras.RealDictCursor,
-                connect_timeout=10
-            )
+            conn = _get_db_pool().getconn()
+            if conn is None:
+                conn = psycopg2.connect(
+                    DATABASE_URL,
+                    cursor_factory=psycopg2.extras.RealDictCursor,
+                    connect_timeout=10
+                )
             conn.autocommit = True
             return conn
         except psycopg2.OperationalError as e: